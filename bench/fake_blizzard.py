@@ -0,0 +1,48 @@
+"""A local stub of the blizzard OAuth and character profile API"""
+from collections import Counter
+
+from aiohttp import web
+
+last_modified = "Sun, 10 Jan 2021 12:00:00 GMT"
+
+
+class FakeBlizzard(object):
+    """Answers token requests and profile lookups, every character is a horde mage
+    unless its name starts with "missing", which are not found
+
+    Attributes
+    -----------
+    calls: :class:`collections.Counter`
+        The number of requests received by each route.
+    """
+    def __init__(self, faction="Horde", class_="mage"):
+        self.faction = faction
+        self.class_ = class_
+        self.calls = Counter()
+        self.runner = None
+
+    async def start(self, port, host="127.0.0.1"):
+        app = web.Application()
+        app.router.add_get("/oauth/token", self.token)
+        app.router.add_get("/profile/wow/character/{realm}/{name}", self.profile)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def token(self, request):
+        self.calls["token"] += 1
+        return web.json_response({"access_token": "bench", "token_type": "bearer", "expires_in": 86399})
+
+    async def profile(self, request):
+        self.calls["profile"] += 1
+        if request.match_info["name"].startswith("missing"):
+            raise web.HTTPNotFound()
+        if request.headers.get("If-Modified-Since") == last_modified:
+            return web.Response(status=304)
+        return web.json_response(
+            {"faction": {"name": self.faction}, "character_class": {"name": self.class_}},
+            headers={"Last-Modified": last_modified})
@@ -0,0 +1,196 @@
+"""In-process stand-ins for the parts of discord the bot talks to
+
+Only what the booking, board and request code touches is implemented. Every call that would be
+a REST request against discord goes through :meth:`FakeHTTP.call`, so benchmarks can count them
+and optionally add latency. Users can be given a script of answers, which are sent back as real
+:class:`discord.Message` objects whenever the bot DMs them a question.
+"""
+from collections import Counter
+from types import SimpleNamespace
+import asyncio
+import itertools
+
+import discord
+
+snowflakes = itertools.count(100000000000000000)
+
+
+class FakeHTTP(object):
+    def __init__(self, latency=0.0):
+        self.calls = Counter()
+        self.latency = latency
+
+    async def call(self, route):
+        self.calls[route] += 1
+        await asyncio.sleep(self.latency)
+
+
+class FakeReaction(object):
+    def __init__(self, emoji):
+        self.emoji = emoji
+        self.members = []
+
+    @property
+    def count(self):
+        return len(self.members)
+
+    def users(self):
+        return FakeUserIterator(self.members)
+
+
+class FakeUserIterator(object):
+    def __init__(self, users):
+        self._users = list(users)
+
+    async def flatten(self):
+        return self._users
+
+
+class FakeMessage(object):
+    def __init__(self, client, channel, content=None, embed=None, author=None):
+        self.id = next(snowflakes)
+        self.client = client
+        self.channel = channel
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.author = author
+        self.reactions = []
+
+    def react(self, emoji, user):
+        """Adds a reaction without an API call, as a user reacting in the discord client would"""
+        for reaction in self.reactions:
+            if str(reaction.emoji) == str(emoji):
+                break
+        else:
+            reaction = FakeReaction(emoji)
+            self.reactions.append(reaction)
+        if user not in reaction.members:
+            reaction.members.append(user)
+
+    async def edit(self, content=None, embed=None):
+        await self.client.http.call("edit_message")
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+
+    async def delete(self):
+        await self.client.http.call("delete_message")
+        if self.channel.messages.pop(self.id, None) is None:
+            raise not_found("Unknown Message")
+
+    async def add_reaction(self, emoji):
+        await self.client.http.call("add_reaction")
+        self.react(emoji, self.client.user)
+
+    async def remove_reaction(self, emoji, member):
+        await self.client.http.call("remove_reaction")
+        for reaction in self.reactions:
+            if str(reaction.emoji) == str(emoji):
+                reaction.members = [m for m in reaction.members if m.id != member.id]
+
+    async def clear_reactions(self):
+        await self.client.http.call("clear_reactions")
+        self.reactions = []
+
+
+class FakeChannel(object):
+    def __init__(self, client, channel_id=None):
+        self.id = channel_id or next(snowflakes)
+        self.client = client
+        self.messages = {}
+
+    @property
+    def mention(self):
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, *, embed=None):
+        await self.client.http.call("send_message")
+        message = FakeMessage(self.client, self, content, embed, self.client.user)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        await self.client.http.call("fetch_message")
+        if message_id not in self.messages:
+            raise not_found("Unknown Message")
+        return self.messages[message_id]
+
+
+class FakeUser(discord.User):
+    """A discord user whose DMs are kept in a fake channel
+
+    Attributes
+    -----------
+    script: :class:`list`
+        The answers still to be given, one per question the bot DMs the user.
+    """
+    def __init__(self, client, user_id=None, name="user", bot=False, script=None):
+        self.id = user_id or next(snowflakes)
+        self.name = name
+        self.discriminator = "0001"
+        self.avatar = None
+        self.bot = bot
+        self.system = False
+        self._public_flags = 0
+        self._state = None
+        self.client = client
+        self.script = list(script or [])
+        self.dm = FakeChannel(client)
+
+    @property
+    def dm_channel(self):
+        return self.dm
+
+    async def send(self, content=None, *, embed=None):
+        message = await self.dm.send(content, embed=embed)
+        if self.script and embed is not None and embed.description.startswith("Please respond with"):
+            asyncio.ensure_future(self.client.answer(self, self.script.pop(0)))
+        return message
+
+
+class FakeClient(object):
+    """Enough of :class:`discord.ext.commands.Bot` for the booking code, which calls the bot's
+    methods unbound with :attr:`Booking.client` as self"""
+    dispatch = discord.Client.dispatch
+    wait_for = discord.Client.wait_for
+
+    def __init__(self, latency=0.0):
+        self.http = FakeHTTP(latency)
+        self.loop = asyncio.get_event_loop()
+        self._listeners = {}
+        self._connection = self
+        self.channels = {}
+        self.users = {}
+        self.user = self.add_user(name="PvpSignups", bot=True)
+
+    def add_channel(self, channel_id=None):
+        channel = FakeChannel(self, channel_id)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_user(self, user_id=None, name="user", bot=False, script=None):
+        user = FakeUser(self, user_id, name, bot, script)
+        self.users[user.id] = user
+        return user
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    async def answer(self, user, content):
+        """Sends a DM from the user once the bot is waiting for one"""
+        while not self._listeners.get("message"):
+            await asyncio.sleep(0)
+        message = discord.Message.__new__(discord.Message)
+        message.id = next(snowflakes)
+        message.content = content
+        message.author = user
+        message.channel = user.dm
+        self.dispatch("message", message)
+
+
+def not_found(text):
+    return discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), text)
@@ -0,0 +1,56 @@
+"""An in-memory stand-in for a google sheets worksheet, used in place of :class:`utils.sheets.GspreadSheet`"""
+from collections import Counter
+import asyncio
+import re
+
+a1_range = re.compile(r"([A-Z]+)(\d+):([A-Z]+)(\d+)")
+
+
+class FakeSheet(object):
+    """Keeps the cells of a worksheet in a dict and counts requests as the sheets API would bill them
+
+    Attributes
+    -----------
+    cells: :class:`dict`
+        The value of each written cell, keyed by (row, column), both 1-indexed.
+    calls: :class:`collections.Counter`
+        The number of requests made by each method.
+    fail: :class:`int`
+        The number of upcoming write requests that raise instead of writing.
+    """
+    def __init__(self, latency=0.0):
+        self.cells = {}
+        self.calls = Counter()
+        self.latency = latency
+        self.fail = 0
+
+    async def ids(self):
+        self.calls["read"] += 1
+        await asyncio.sleep(self.latency)
+        rows = max((row for row, column in self.cells), default=0)
+        return [self.cells.get((row, 1), "") for row in range(1, rows + 1)]
+
+    async def batch_update(self, data, rows):
+        self.calls["write"] += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("Fake sheets request failed")
+        for update in data:
+            first_column, first_row, _, last_row = a1_range.fullmatch(update["range"]).groups()
+            assert int(last_row) - int(first_row) + 1 == len(update["values"]), "range and values differ in length"
+            for row, values in enumerate(update["values"], int(first_row)):
+                for column, value in enumerate(values, column_number(first_column)):
+                    self.cells[(row, column)] = value
+
+    def row(self, row):
+        """:class:`list` The values of a row"""
+        columns = max((column for r, column in self.cells if r == row), default=0)
+        return [self.cells.get((row, column)) for column in range(1, columns + 1)]
+
+
+def column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
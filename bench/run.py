@@ -0,0 +1,375 @@
+"""Offline benchmarks of the bot's hot paths
+
+Drives the real booking, untaken board, snapshot, sheet sync and pricing code against the in-process
+discord stand-in (:mod:`bench.fake_discord`), the blizzard API stub (:mod:`bench.fake_blizzard`) and
+in-memory worksheets (:mod:`bench.fake_sheets`), inside a temporary data directory seeded with
+synthetic bookings. Latency percentiles, discord and blizzard API calls and memory are printed,
+saved to ``bench/results`` (ignored by git, ``--results`` picks another directory) and compared
+with the previous saved run.
+
+    python -m bench.run --bookings 5000 --creates 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+results_directory = os.path.join(repo, "bench", "results")
+realms = ["Draenor", "Ravencrest", "Silvermoon", "Kazzak", "Tarren Mill", "Argent Dawn"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def synthetic_record(instname, booking_id, timestamp, status, bracket, rng, spec_emotes, boost_types):
+    class_ = rng.choice(list(spec_emotes))
+    return {
+        "v": 1,
+        "id": booking_id,
+        "instance": instname,
+        "author": rng.randrange(10 ** 17, 10 ** 18),
+        "bracket": bracket,
+        "status": status,
+        "type": rng.choice(boost_types),
+        "buyer": {
+            "name": f"buyer{rng.randrange(10 ** 6)}", "realm": rng.choice(realms), "faction": rng.choice(["Horde", "Alliance"]),
+            "class_": class_, "spec": rng.choice(list(spec_emotes[class_])), "rating": rng.randrange(0, 2400)
+        },
+        "price_recommendation": rng.randrange(50000, 500000),
+        "ad_price_estimate": rng.randrange(50000, 500000),
+        "price": 0,
+        "booster": {"prim": None, "sec": None, "prim_cut": 0, "sec_cut": 0, "ad_cut": 0, "mana_cut": 0},
+        "notes": "N/A",
+        "post_message": None,
+        "timestamp": timestamp
+    }
+
+
+def seed_data_directory(directory, args, port, rng):
+    """Writes the config, pricing and synthetic bookings of every benchmark instance"""
+    source = os.path.join(repo, "data")
+    os.makedirs(os.path.join(directory, "data", "instances"))
+    shutil.copy(os.path.join(source, "data.json"), os.path.join(directory, "data", "data.json"))
+    with open(os.path.join(source, "data.json")) as f:
+        game_data = json.load(f)
+    with open(os.path.join(directory, "data", "token.json"), "w") as f:
+        json.dump({}, f)
+    with open(os.path.join(directory, "data", "config.json"), "w") as f:
+        json.dump({
+            "directory": "data", "subdir": "/config.json", "command_prefix": "!", "discord_token": "bench",
+            "wowapi_id": "bench", "wowapi_secret": "bench", "auto_faction_class_input": True,
+            "twos_emoji": "2⃣", "threes_emoji": "3⃣", "take_emoji": "✅", "schedule_emoji": "\U0001f4c5",
+            "choose_faction_emoji": "⚔", "horde_emoji": "horde", "alliance_emoji": "alliance",
+            "post_wait_time": 3600, "teammate_pick_timeout": 3600, "bad_luck_protection_mofifier": 0.00001,
+            "untaken_refresh_delay": 0, "wowapi_oauth_url": f"http://127.0.0.1:{port}/oauth/token",
+            "wowapi_api_url": f"http://127.0.0.1:{port}", "profile_cache_path": "data/profiles.json"
+        }, f, indent=4)
+
+    channel_ids = {}
+    now = time.time()
+    statuses = [7] * 4 + [3] * 3 + [6] * 3
+    for n in range(args.instances):
+        instname = f"bench{n}"
+        instdir = os.path.join(directory, "data", "instances", instname)
+        os.makedirs(instdir)
+        shutil.copy(os.path.join(source, "instances", "pvp_bookings", "pricing.json"), os.path.join(instdir, "pricing.json"))
+        base = 1000 * (n + 1)
+        channel_ids[instname] = [base + i for i in range(6)]
+        with open(os.path.join(instdir, "config.json"), "w") as f:
+            json.dump({
+                "directory": f"data/instances/{instname}", "subdir": "/config.json", "guild_id": base,
+                "post_2v2": base + 1, "post_3v3": base + 2, "post_glad": base + 3, "request_channel": base,
+                "request_message": 0, "untaken_channels": {"2v2": base + 4, "3v3": base + 5},
+                "untaken_messages": {"2v2": [], "3v3": []}, "horde_role": "<@&1>", "alliance_role": "<@&2>",
+                "booster_cut": 0.77, "advertiser_cut": 0.11, "management_cut": 0.12, "managers": []
+            }, f, indent=4)
+        with open(os.path.join(instdir, "userweights.json"), "w") as f:
+            json.dump({"2v2": {}, "3v3": {}}, f)
+        records = {}
+        for i in range(args.bookings // args.instances):
+            booking_id = str(1000000000 + n * 10 ** 8 + i)
+            bracket = rng.choice(["2v2", "3v3"])
+            records[booking_id] = synthetic_record(
+                instname, booking_id, now - rng.uniform(0, 4 * 86400), rng.choice(statuses), bracket, rng,
+                game_data["spec_emotes"], game_data["boost_types"] + game_data["bracket_boost_types"][bracket])
+        with open(os.path.join(instdir, "bookings.json"), "w") as f:
+            json.dump(records, f)
+    return channel_ids
+
+
+def summarize(samples):
+    """:class:`dict` Latency percentiles of the samples, in milliseconds"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 4)
+    return {
+        "count": len(ordered), "p50": percentile(0.5), "p90": percentile(0.9), "p99": percentile(0.99),
+        "max": round(ordered[-1] * 1000, 4), "mean": round(sum(ordered) / len(ordered) * 1000, 4)
+    }
+
+
+class Recorder(object):
+    """Collects the latency samples and API calls of each benchmark phase"""
+    def __init__(self, client, blizzard):
+        self.client = client
+        self.blizzard = blizzard
+        self.phases = {}
+
+    def phase(self, name, samples, calls_before, blizzard_before, **extra):
+        discord_calls = self.client.http.calls - calls_before
+        blizzard_calls = self.blizzard.calls - blizzard_before
+        self.phases[name] = {
+            **summarize(samples),
+            "discord_calls": dict(discord_calls),
+            "discord_calls_per_op": round(sum(discord_calls.values()) / len(samples), 3),
+            "blizzard_calls": dict(blizzard_calls),
+            **extra
+        }
+        print(f"{name:<40} p50 {self.phases[name]['p50']:>10.3f}ms  p99 {self.phases[name]['p99']:>10.3f}ms  "
+              f"discord calls/op {self.phases[name]['discord_calls_per_op']:>8}  blizzard {sum(blizzard_calls.values())}")
+
+    def snapshot(self):
+        return Counter(self.client.http.calls), Counter(self.blizzard.calls)
+
+
+async def run(args, channel_ids, port):
+    # the bot's modules read ./data when they are imported, so they are only imported once it exists
+    from utils import pricing
+    from utils.booking import Booking, sheet_statuses
+    from utils.config import cfg, icfg
+    from utils.request import request
+    from utils.store import istore
+    from utils.archive import BookingArchive
+    from bench.fake_blizzard import FakeBlizzard
+    from bench.fake_discord import FakeClient
+    from bench.fake_sheets import FakeSheet
+    import logging
+    logging.getLogger("PvpSignups").setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    blizzard = FakeBlizzard()
+    await blizzard.start(port)
+    client = FakeClient(latency=args.latency)
+    for ids in channel_ids.values():
+        for channel_id in ids:
+            client.add_channel(channel_id)
+    recorder = Recorder(client, blizzard)
+    instnames = list(icfg.keys())
+
+    # pricing
+    for name, quote in (
+            ("pricing.set_rating", lambda: pricing.set_rating(instnames[0], rng.choice(["2v2", "3v3"]), rng.randrange(0, 1200), rng.randrange(1200, 2400))),
+            ("pricing.one_win", lambda: pricing.one_win(instnames[0], rng.choice(["2v2", "3v3"]), rng.randrange(0, 2400)))):
+        before = recorder.snapshot()
+        samples = []
+        for _ in range(args.pricing):
+            start = time.perf_counter()
+            quote()
+            samples.append(time.perf_counter() - start)
+        recorder.phase(name, samples, *before)
+    before = recorder.snapshot()
+    quotes = [("2v2", rng.randrange(0, 1200), rng.randrange(1200, 2400)) for _ in range(args.pricing)]
+    start = time.perf_counter()
+    pricing.set_rating_many(instnames[0], quotes)
+    recorder.phase("pricing.set_rating_many (per quote)", [(time.perf_counter() - start) / len(quotes)], *before)
+
+    # startup
+    before = recorder.snapshot()
+    start = time.perf_counter()
+    await Booking.load(client)
+    recorder.phase("Booking.load", [time.perf_counter() - start], *before, bookings=len(Booking.registry))
+
+    tracemalloc.start()
+    records = [record for instname in instnames for record in istore[instname].records.values()]
+    encoded = json.dumps(records)
+    memory = {}
+    baseline = tracemalloc.get_traced_memory()[0]
+    decoded = [Booking.from_dict(record) for record in records]
+    memory["bytes_per_booking"] = (tracemalloc.get_traced_memory()[0] - baseline) / max(len(records), 1)
+    del decoded
+    # a registered booking also has its record held by the store, an archived one only has its columns
+    baseline = tracemalloc.get_traced_memory()[0]
+    copies = json.loads(encoded)
+    memory["bytes_per_record"] = (tracemalloc.get_traced_memory()[0] - baseline) / max(len(records), 1)
+    del copies, encoded
+    baseline = tracemalloc.get_traced_memory()[0]
+    archive = BookingArchive()
+    for record in records:
+        archive.add(record)
+    memory["bytes_per_archived_booking"] = (tracemalloc.get_traced_memory()[0] - baseline) / max(len(records), 1)
+    del archive
+    tracemalloc.stop()
+
+    # untaken boards
+    before = recorder.snapshot()
+    start = time.perf_counter()
+    await asyncio.gather(*[Booking.update_untaken_boosts(instname) for instname in instnames])
+    recorder.phase("update_untaken_boosts (initial)", [time.perf_counter() - start], *before,
+                   pages=sum(len(board.messages) for boards in Booking.untaken_boards.values() for board in boards.values()))
+
+    before = recorder.snapshot()
+    samples = []
+    for _ in range(args.refreshes):
+        pending = [b for b in Booking.registry.filter(status=3)]
+        if not pending:
+            break
+        b = rng.choice(pending)
+        b.status = 7
+        b.cache()
+        start = time.perf_counter()
+        await Booking.update_untaken_boosts(b.instance, b.bracket)
+        samples.append(time.perf_counter() - start)
+    recorder.phase("update_untaken_boosts (one booking)", samples, *before)
+
+    # bookings document
+    before = recorder.snapshot()
+    cold, warm = [], []
+    for b in rng.sample(list(Booking.registry), min(args.refreshes, len(Booking.registry))):
+        b.cache()
+        start = time.perf_counter()
+        Booking.json_instances()
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        Booking.json_instances()
+        warm.append(time.perf_counter() - start)
+    recorder.phase("json_instances (after a change)", cold, *before)
+    recorder.phase("json_instances (unchanged)", warm, *recorder.snapshot())
+
+    # booking creation, names repeat so some profile lookups are served from the cache
+    before = recorder.snapshot()
+    samples, created = [], []
+    for i in range(args.creates):
+        script = ["1 win", f"buyer{rng.randrange(args.creates // 2 + 1)}", rng.choice(realms), "Fire", str(rng.randrange(0, 2400)), "90000", "Bench"]
+        author = client.add_user(name=f"advertiser{i}", script=script)
+        start = time.perf_counter()
+        booking = Booking(rng.choice(["2v2", "3v3"]), author, rng.choice(instnames))
+        await booking.create()
+        samples.append(time.perf_counter() - start)
+        created.append(booking)
+    recorder.phase("Booking.create", samples, *before)
+
+    before = recorder.snapshot()
+    samples = []
+    boosters = [client.add_user(name=f"booster{i}") for i in range(20)]
+    for booking in created:
+        for booster in rng.sample(boosters, 5):
+            booking.post_message.react(cfg.take_emoji, booster)
+        start = time.perf_counter()
+        await booking.pick_winner()
+        samples.append(time.perf_counter() - start)
+    recorder.phase("Booking.pick_winner", samples, *before)
+
+    # sheet sync, every booking that belongs on the sheet is changed a few times and then written in batches
+    sheets = {instname: FakeSheet() for instname in instnames}
+    await Booking.sheets.start(sheets)
+    writes_before = sum(sheet.calls["write"] for sheet in sheets.values())
+    before = recorder.snapshot()
+    synced = [b for b in Booking.registry if b.status in sheet_statuses]
+    start = time.perf_counter()
+    for _ in range(3):
+        for b in synced:
+            b.update_sheet()
+    await Booking.sheets.stop()
+    recorder.phase("SheetSync (per booking)", [(time.perf_counter() - start) / max(len(synced), 1)], *before, rows=len(synced),
+                   sheet_writes=sum(sheet.calls["write"] for sheet in sheets.values()) - writes_before)
+
+    # expiry
+    before = recorder.snapshot()
+    count = len(Booking.registry) + len(Booking.archive)
+    start = time.perf_counter()
+    await Booking.cleanup()
+    recorder.phase("Booking.cleanup", [time.perf_counter() - start], *before,
+                   deleted=count - len(Booking.registry) - len(Booking.archive))
+
+    await request.close()
+    await blizzard.stop()
+    return recorder.phases, memory
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=repo, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(result, previous):
+    print(f"\nCompared with {previous['revision']} ({previous['time']}):")
+    for name, phase in result["phases"].items():
+        old = previous["phases"].get(name)
+        if old and old["p50"]:
+            change = (phase["p50"] - old["p50"]) / old["p50"] * 100
+            print(f"{name:<40} p50 {old['p50']:>10.3f}ms -> {phase['p50']:>10.3f}ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=5000, help="synthetic bookings loaded at startup")
+    parser.add_argument("--instances", type=int, default=2)
+    parser.add_argument("--creates", type=int, default=100, help="bookings created through the DM flow")
+    parser.add_argument("--refreshes", type=int, default=50, help="single booking board refreshes and document rebuilds")
+    parser.add_argument("--pricing", type=int, default=10000, help="price quotes per pricing benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake discord API call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=results_directory, help="directory the results are saved to and compared with")
+    parser.add_argument("--no-save", action="store_true", help="don't write the results to the results directory")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    port = free_port()
+    directory = tempfile.mkdtemp(prefix="pvpsignups-bench-")
+    cwd = os.getcwd()
+    try:
+        channel_ids = seed_data_directory(directory, args, port, rng)
+        os.chdir(directory)
+        sys.path.insert(0, repo)
+        loop = asyncio.get_event_loop()
+        phases, memory = loop.run_until_complete(run(args, channel_ids, port))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result = {
+        "revision": git_revision(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "parameters": vars(args),
+        "memory": {
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            **{name: round(value) for name, value in memory.items()}
+        },
+        "phases": phases
+    }
+    print(f"\nmax RSS {result['memory']['max_rss_kb']} KB, {result['memory']['bytes_per_booking']} bytes per decoded booking"
+          f" and {result['memory']['bytes_per_record']} per stored record, {result['memory']['bytes_per_archived_booking']} bytes per archived booking")
+
+    if os.path.isdir(args.results):
+        previous = sorted(f for f in os.listdir(args.results) if f.endswith(".json"))
+        if previous:
+            with open(os.path.join(args.results, previous[-1])) as f:
+                compare(result, json.load(f))
+    if not args.no_save:
+        os.makedirs(args.results, exist_ok=True)
+        path = os.path.join(args.results, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['revision']}.json")
+        with open(path, "w") as f:
+            json.dump(result, f, indent=4)
+        print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
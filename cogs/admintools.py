@@ -1,10 +1,14 @@
 from discord.ext import commands
 import discord
 from utils.misc import base_embed, get_logger
-from utils.config import icfg
+from utils.config import cfg, icfg
 from utils import exceptions
 from utils.booking import Booking, statuses
+from utils.sampler import profiler
 from math import ceil
+from time import time
+import threading
+import io
 
 logger = get_logger('PvpSignups')
 
@@ -21,10 +25,10 @@ class AdminTools(commands.Cog):
     async def bookings(self, ctx, active=None):
         page_length = 25
         if active == "active":
-            booking_list = [b for b in Booking.instances if b.status == 3]
+            booking_list = Booking.registry.filter(status=3)
         else:
-            booking_list = Booking.instances
-        booking_pages = [Booking.instances[i:i + page_length] for i in range(0, len(booking_list), page_length)]
+            booking_list = Booking.filter()
+        booking_pages = [booking_list[i:i + page_length] for i in range(0, len(booking_list), page_length)]
         embed = base_embed("**Current bookings:**")
         if not booking_list:
             await ctx.send(embed=base_embed("There are currently no active bookings"))
@@ -42,7 +46,7 @@ class AdminTools(commands.Cog):
                 else:
                     booking_string += '``N/A``\nBooster: ``N/A``\n'
                 embed.add_field(name=f"\nID: ``{b.id}``", value=booking_string, inline=False)
-            embed.set_footer(text=f"Page {page_num+1} of {ceil(len(Booking.instances)/page_length)}")
+            embed.set_footer(text=f"Page {page_num+1} of {ceil(len(booking_list)/page_length)}")
             await ctx.send(embed=embed)
             embed = base_embed("")
 
@@ -73,6 +77,7 @@ class AdminTools(commands.Cog):
                     f" has been given to you by {ctx.message.author.display_name}. If this is unexpected please contact them"
                 ))
             booking._author = user
+            booking.registry.notify("transferred", booking, author=user.id, transferred_by=ctx.message.author.id)
             await ctx.send(embed=base_embed(
                 f"Ownership of booking with ID ``{booking.id}`` (``{booking.bracket} {booking.type} {booking.rating}``)"
                 f" has been given to {user.mention}"
@@ -91,7 +96,7 @@ class AdminTools(commands.Cog):
             booking.delete()
             await ctx.message.author.send(embed=base_embed(f"Booking ``{booking_id}`` has been deleted, if it is on the untaken boosts board, it will be updated in a second"))
             await ctx.message.delete()
-            await Booking.update_untaken_boosts(instname)
+            await Booking.update_untaken_boosts(instname, booking.bracket, wait=False)
         else:
             raise exceptions.RequestFailed("You do not have permission to do that")
 
@@ -101,6 +106,26 @@ class AdminTools(commands.Cog):
         await Booking.update_untaken_boosts(instname)
         await ctx.send("👍")
 
+    @commands.command(description="Samples where the bot spends its time and sends the stacks in flamegraph collapsed format")
+    @commands.has_permissions(administrator=True)
+    async def profile(self, ctx, seconds: int = 30):
+        if profiler.running:
+            raise exceptions.RequestFailed("The profiler is already running")
+        seconds = max(1, min(seconds, getattr(cfg, "profiler_max_seconds", 300)))
+        profiler.start(seconds, threading.get_ident())
+        await ctx.send(embed=base_embed(f"Profiling for {seconds} seconds, use ``stopprofile`` to stop early"))
+        await self.client.loop.run_in_executor(None, profiler.join)
+        await ctx.send(
+            embed=base_embed(f"Collected {profiler.samples} samples, render them with flamegraph.pl or speedscope"),
+            file=discord.File(io.BytesIO(profiler.collapsed().encode()), filename=f"profile-{int(time())}.folded"))
+
+    @commands.command(description="Stops the running profiler early")
+    @commands.has_permissions(administrator=True)
+    async def stopprofile(self, ctx):
+        if not profiler.running:
+            raise exceptions.RequestFailed("The profiler is not running")
+        profiler.stop()
+
 
 def setup(client):
     client.add_cog(AdminTools(client))
@@ -1,7 +1,9 @@
 from discord.ext import commands
-import json
 from discord import Member
 from utils.misc import base_embed
+from utils.config import icfg
+from utils.weights import iweights
+from utils import exceptions
 
 
 class Blpcommands(commands.Cog):
@@ -12,6 +14,13 @@ class Blpcommands(commands.Cog):
 
         self.client = client
 
+    @staticmethod
+    def instance_weights(ctx):
+        for instname, instconfig in icfg.items():
+            if ctx.guild and instconfig.guild_id == ctx.guild.id:
+                return iweights[instname]
+        raise exceptions.RequestFailed("This server does not have a booking instance")
+
     @commands.command(description='Lists bad luck protection values of all users in the channel')
     @commands.has_permissions(administrator=True)
     async def blplist(self, ctx, bracket):
@@ -20,10 +29,9 @@ class Blpcommands(commands.Cog):
             raise Exception("Invalid argument, bracket must be '2v2' or '3v3'")
 
         members = [x for x in ctx.channel.members if x.bot is False]
-        with open('data/sylvanas/userweights.json', 'r') as f:
-            user_weights = json.load(f)[bracket]
+        weights = self.instance_weights(ctx)
         users = [x.display_name for x in members]
-        weights = [str(round(user_weights[str(x.id)], 2)) if str(x.id) in user_weights.keys() else '1' for x in members]
+        user_weights = [str(round(weights.get(bracket, x.id), 2)) for x in members]
 
         embed = base_embed('Bad luck protection values for ' + bracket)
         embed.add_field(
@@ -32,7 +40,7 @@ class Blpcommands(commands.Cog):
         )
         embed.add_field(
             name='__Value:__',
-            value='\n'.join(weights)
+            value='\n'.join(user_weights)
         )
         await ctx.send(embed=embed)
 
@@ -40,11 +48,10 @@ class Blpcommands(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def blp(self, ctx, user: Member = None):
 
-        with open("data/sylvanas/userweights.json") as f:
-            userweights = json.load(f)
+        weights = self.instance_weights(ctx)
         user = user if user else ctx.message.author
-        weight_2 = str(round(userweights['2v2'][user.id], 2)) if user.id in userweights['2v2'].keys() else '1'
-        weight_3 = str(round(userweights['3v3'][user.id], 2)) if user.id in userweights['3v3'].keys() else '1'
+        weight_2 = str(round(weights.get('2v2', user.id), 2))
+        weight_3 = str(round(weights.get('3v3', user.id), 2))
         await ctx.send(embed=base_embed(
             f"{user.display_name}'s bad luck protection value is "
             f"**``{weight_2}`` in 2v2** and **``{weight_3}`` in 3v3**"))
@@ -56,11 +63,7 @@ class Blpcommands(commands.Cog):
             raise commands.BadArgument
 
         user = user if user else ctx.message.author
-        with open('data/sylvanas/userweights.json', 'r') as f:
-            user_weights = json.load(f)
-        user_weights[bracket][str(user.id)] = value
-        with open('data/sylvanas/userweights.json', 'w') as f:
-            json.dump(user_weights, f, indent=4)
+        self.instance_weights(ctx).set(bracket, user.id, value)
 
         await ctx.send(embed=base_embed(f"{user.mention}'s {bracket} weight has been set to ``{value}``"))
 
@@ -1,5 +1,5 @@
 from utils.booking import Booking
-from utils import exceptions
+from utils.messages import message_cache
 from utils.config import cfg, icfg, data
 from utils.misc import base_embed, get_logger
 
@@ -23,7 +23,6 @@ class Bookings(commands.Cog):
         }
         for instname, instconfig in icfg.items():
             self.request_channels[instconfig.request_channel] = {
-                "message_id": instconfig.request_message,
                 "name": instname
             }
             self.untaken_channels["2v2"][instconfig.untaken_channels["2v2"]] = instname
@@ -33,20 +32,35 @@ class Bookings(commands.Cog):
     async def on_raw_reaction_add(self, reaction):
         if reaction.channel_id in self.request_channels.keys():
             instance = self.request_channels[reaction.channel_id]
-            cond1 = reaction.message_id == instance["message_id"]
-            cond2 = reaction.emoji.name in cfg.twos_emoji, cfg.threes_emoji
+            cond1 = reaction.message_id == icfg[instance["name"]].request_message
+            cond2 = reaction.emoji.name in (cfg.twos_emoji, cfg.threes_emoji)
             cond3 = reaction.user_id != self.client.user.id
             if cond1 and cond2 and cond3:
                 author = commands.Bot.get_user(self.client, reaction.user_id)
                 bracket = '2v2' if reaction.emoji.name == cfg.twos_emoji else '3v3'
                 booking = Booking(bracket, author, instance["name"])
-                message = await Booking.request_channels[instance["name"]].fetch_message(icfg[instance["name"]].request_message)
-                await message.remove_reaction(reaction.emoji, author)
-                try:
-                    logger.info(f"Booking being created by {author.display_name} for {instance['name']}")
-                    await booking.create()
-                except exceptions.BookingUntaken:
-                    pass
+                message = await message_cache.fetch(Booking.request_channels[instance["name"]], reaction.message_id)
+                await message.remove_reaction(reaction.emoji, discord.Object(reaction.user_id))
+                logger.info(f"Booking being created by {author.display_name} for {instance['name']}")
+                await booking.create()
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if not message_cache.invalidate(payload.message_id):
+            return
+        for instname, boards in Booking.untaken_boards.items():
+            for board in boards.values():
+                if board.discard_message(payload.message_id):
+                    logger.warning(f"Untaken message {payload.message_id} of {instname} was deleted, it will be replaced on the next refresh")
+        if payload.channel_id in self.request_channels.keys():
+            logger.warning(f"Request message {payload.message_id} was deleted, it will be recreated on the next restart")
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or not message.mentions:
+            return
+        for booking in Booking.awaiting_teammate(message.author.id):
+            await booking.pick_teammate(message.mentions[0])
 
     @commands.command(description="Take an untaken boost, must be in the untaken boosts channel")
     async def take(self, ctx, booking_id, partner: discord.User = None):
@@ -71,13 +85,15 @@ class Bookings(commands.Cog):
                                                        f"**Message {booking.author.mention} before you start, as they will most likely have to collect the gold**"))
         logger.info(f"Booking {booking.id} has been claimed by {booking.booster.prim}")
         booking.status = 3
-        await Booking.update_untaken_boosts(booking.instance)
+        booking.cache()
+        booking.registry.notify("taken", booking, booster=booking.booster.prim, teammate=booking.booster.sec)
+        await Booking.update_untaken_boosts(booking.instance, booking.bracket, wait=False)
 
     @commands.command()
     async def rebook(self, ctx, message_id: int):
         message = None
         for iname, iconfig in Booking.post_channels.items():
-            for bracket, channel in iconfig:
+            for bracket, channel in iconfig.items():
                 try:
                     message = await channel.fetch_message(message_id)
                     break
@@ -90,7 +106,6 @@ class Bookings(commands.Cog):
             return
         fields = message.embeds[0].fields
         b = Booking(bracket, ctx.message.author, iname)
-        b.status = 7
         b.type = fields[1].value.replace("``", "")
         b.buyer.name, b.buyer.realm = fields[0].value[fields[0].value.find("[") + 1:fields[0].value.find("]")].split("-")
         b.buyer.faction = fields[3].value[fields[3].value.find("``")+2:fields[3].value.rfind("``")]
@@ -105,8 +120,9 @@ class Bookings(commands.Cog):
             b.ad_price_estimate = 0
         b.notes = fields[6].value[fields[6].value.find("``") + 2:fields[6].value.rfind("``")]
         b.post_message = message_id
+        b.status = 7
         b.cache()
-        await Booking.update_untaken_boosts(iname)
+        await Booking.update_untaken_boosts(iname, b.bracket, wait=False)
         await ctx.send(embed=base_embed(f"Booking has been reposted with new ID: ``{b.id}``"))
 
 
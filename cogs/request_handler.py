@@ -1,12 +1,98 @@
 from utils.misc import get_logger
-from utils.booking import Booking
+from utils.booking import Booking, statuses
+from utils import metrics
 
 from discord.ext import commands
 
 from aiohttp import web
 import asyncio
+import base64
+import json
 
 logger = get_logger("PvpSignups")
+max_page_length = 1000
+stream_chunk_length = 500
+keepalive_interval = 15
+
+
+def parse_status(value):
+    if value.isnumeric() and int(value) in range(len(statuses)):
+        return int(value)
+    for i, status in enumerate(statuses):
+        if status.lower() == value.lower():
+            return i
+    raise web.HTTPBadRequest(text=f"Unknown status: {value}")
+
+
+def accepts_gzip(accept_encoding):
+    """:class:`bool` Whether an Accept-Encoding header allows gzip, an explicit ``q=0`` refuses it"""
+    quality = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            quality[coding.lower()] = q
+    return quality.get("gzip", quality.get("*", 0.0)) > 0
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, booking_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)) or not isinstance(booking_id, str):
+            raise ValueError
+        return timestamp, booking_id
+    except (ValueError, TypeError):
+        raise web.HTTPBadRequest(text="Invalid cursor")
+
+
+def query_bookings(query):
+    """:class:`list` The (timestamp, booking ID) of the registered and archived bookings matching the query parameters,
+    ordered by creation time, archived bookings are matched by column without decoding them
+
+    Accepted parameters are instance, status (number or name), bracket, booster (user ID of either booster),
+    author (user ID), since and until (unix timestamps) and cursor (from a previous page).
+    """
+    try:
+        since = float(query["since"]) if "since" in query else None
+        until = float(query["until"]) if "until" in query else None
+        booster = int(query["booster"]) if "booster" in query else None
+        author = int(query["author"]) if "author" in query else None
+    except ValueError:
+        raise web.HTTPBadRequest(text="since, until, booster and author must be numbers")
+    cursor = decode_cursor(query["cursor"]) if "cursor" in query else None
+    criteria = {
+        "instance": query.get("instance"),
+        "status": parse_status(query["status"]) if "status" in query else None,
+        "bracket": query.get("bracket")
+    }
+
+    def matches(key, boosters, author_id):
+        timestamp = key[0]
+        return (since is None or timestamp >= since) and (until is None or timestamp < until) \
+            and (booster is None or booster in boosters) \
+            and (author is None or author == author_id) \
+            and (cursor is None or key > cursor)
+    keys = [((b.timestamp or 0, b.id), (_int(b.booster.prim), _int(b.booster.sec)), b.authorid) for b in Booking.registry.filter(**criteria)]
+    archive = Booking.archive
+    keys += [((archive.value(booking_id, "timestamp") or 0, booking_id),
+              (_int(archive.value(booking_id, "prim")), _int(archive.value(booking_id, "sec"))),
+              archive.value(booking_id, "author")) for booking_id in archive.filter(**criteria)]
+    return sorted(key for key, boosters, author_id in keys if matches(key, boosters, author_id))
+
+
+def _int(value):
+    return int(value) if value is not None else None
 
 
 class AsyncRequestHandler(commands.Cog):
@@ -17,10 +103,80 @@ class AsyncRequestHandler(commands.Cog):
 
     async def requesthandler(self):
         async def handler(request):
-            return web.Response(body=Booking.json_instances())
+            payload = Booking.snapshot.payload()
+            # the body depends on Accept-Encoding, caches must not serve one encoding to a client asking for the other
+            headers = {"ETag": payload.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            if request.headers.get("If-None-Match") == payload.etag:
+                return web.Response(status=304, headers=headers)
+            if accepts_gzip(request.headers.get("Accept-Encoding", "")):
+                headers["Content-Encoding"] = "gzip"
+                return web.Response(body=Booking.snapshot.gzipped(), content_type="application/json", headers=headers)
+            return web.Response(body=payload.body, content_type="application/json", headers=headers)
+
+        async def bookings_handler(request):
+            try:
+                limit = min(int(request.query.get("limit", 100)), max_page_length)
+            except ValueError:
+                raise web.HTTPBadRequest(text="limit must be a number")
+            if limit < 1:
+                raise web.HTTPBadRequest(text="limit must be at least 1")
+            keys = query_bookings(request.query)
+            page = keys[:limit]
+            next_cursor = encode_cursor(page[-1]) if len(keys) > limit else None
+            body = '{"bookings": [' + ", ".join(Booking.snapshot.fragment(booking_id) for _, booking_id in page) + f'], "next_cursor": {json.dumps(next_cursor)}}}'
+            return web.Response(text=body, content_type="application/json")
+
+        async def stream_handler(request):
+            keys = query_bookings(request.query)
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for i in range(0, len(keys), stream_chunk_length):
+                # bookings deleted while earlier chunks were written have no fragment
+                fragments = (Booking.snapshot.fragment(booking_id) for _, booking_id in keys[i:i + stream_chunk_length])
+                chunk = [fragment for fragment in fragments if fragment is not None]
+                if chunk:
+                    await response.write(("\n".join(chunk) + "\n").encode("utf-8"))
+            await response.write_eof()
+            return response
+
+        async def events_handler(request):
+            feed = Booking.feed
+            queue = feed.subscribe()
+            backlog = feed.since(request.headers.get("Last-Event-ID", request.query.get("since")))
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+            try:
+                if backlog is None:
+                    await response.write(f"id: {feed.epoch}-{feed.seq}\nevent: reset\ndata: {{}}\n\n".encode("utf-8"))
+                    backlog = []
+                for seq, encoded in backlog:
+                    await response.write(f"id: {feed.epoch}-{seq}\ndata: {encoded}\n\n".encode("utf-8"))
+                last_seq = backlog[-1][0] if backlog else feed.seq
+                while queue in feed.subscribers or not queue.empty():
+                    try:
+                        seq, encoded = await asyncio.wait_for(queue.get(), keepalive_interval)
+                    except asyncio.TimeoutError:
+                        await response.write(b": keepalive\n\n")
+                        continue
+                    if seq > last_seq:
+                        await response.write(f"id: {feed.epoch}-{seq}\ndata: {encoded}\n\n".encode("utf-8"))
+                        last_seq = seq
+            except ConnectionResetError:
+                # the client disconnected
+                pass
+            finally:
+                feed.unsubscribe(queue)
+            return response
+
+        async def metrics_handler(request):
+            return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
 
         app = web.Application()
         app.router.add_get("/", handler)
+        app.router.add_get("/bookings", bookings_handler)
+        app.router.add_get("/bookings.ndjson", stream_handler)
+        app.router.add_get("/events", events_handler)
+        app.router.add_get("/metrics", metrics_handler)
         runner = web.AppRunner(app)
         await runner.setup()
         self.site = web.TCPSite(runner, 'localhost', 8080)
@@ -1,21 +1,31 @@
 __version__ = "1.0.0"
 
 
-from utils.misc import get_logger, base_embed
+from utils.misc import get_logger, base_embed, configure_logging
 from utils.request import request
+from utils.profiles import profiles
+from utils.weights import iweights
 from utils.booking import Booking
+from utils.scheduler import scheduler
+from utils.sampler import watchdog
 from utils import exceptions
-from utils.config import cfg, icfg, devmode
+from utils.config import cfg, icfg, devmode, flush_configs, reload_configs
 
 from discord.ext import commands, tasks
 import discord
 
+import asyncio
 import os
 import sys
 import traceback
 from inspect import Parameter
 
 logger = get_logger('PvpSignups')
+configure_logging(
+    filename=getattr(cfg, "log_file", "discord.log"),
+    max_bytes=getattr(cfg, "log_max_bytes", 5242880),
+    backup_count=getattr(cfg, "log_backup_count", 5),
+    json_format=getattr(cfg, "log_json", False))
 
 
 class PvpSignups(commands.Bot):
@@ -34,10 +44,10 @@ class PvpSignups(commands.Bot):
 
     async def on_ready(self):
         try:
+            await request.start()
+            profiles.load()
             await Booking.load(self)
-            for instname in icfg.keys():
-                pass
-                await Booking.update_untaken_boosts(instname)
+            await asyncio.gather(*[Booking.update_untaken_boosts(instname) for instname in icfg.keys()])
             if cfg.auto_faction_class_input:
                 await request.token('wowapi')
             else:
@@ -50,7 +60,17 @@ class PvpSignups(commands.Bot):
         except exceptions.InvalidTokenResponse:
             cfg.set("auto_faction_class_input", False)
             logger.warning("Bot could not get a blizzard API access token, automatic faction/class input has been disabled")
-        await Booking.cleanup()
+        if not self.cleanup.is_running():
+            self.cleanup.change_interval(seconds=getattr(cfg, "expiry_interval", 600))
+            self.cleanup.start()
+        if not self.flush_caches.is_running():
+            self.flush_caches.start()
+        if not self.watch_configs.is_running():
+            self.watch_configs.change_interval(seconds=getattr(cfg, "config_reload_interval", 5))
+            self.watch_configs.start()
+        await Booking.sheets.start()
+        if getattr(cfg, "watchdog_threshold", 0.5) > 0:
+            watchdog.start(self.loop)
         logger.info("Bot is ready")
 
     def startup(self):
@@ -60,13 +80,20 @@ class PvpSignups(commands.Bot):
             if filename.endswith('.py'):
                 self.load_extension(f'cogs.{filename[:-3]}')
 
+    async def close(self):
+        watchdog.stop()
+        await Booking.sheets.stop()
+        self.flush()
+        await request.close()
+        await super().close()
+
     @staticmethod
     async def tryrestart():
-        if [b for b in Booking.instances if b.status in range(0, 3)]:
+        if Booking.registry.filter(status=0):
             logger.warning("it is not safe to shut down")
             return False
-        for booking in Booking.instances:
-            if booking.status not in range(0, 3):
+        for booking in Booking.registry:
+            if booking.status != 0:
                 booking.cache()
         logger.info("All bookings have been cached, shutting down")
         exit()
@@ -106,10 +133,27 @@ class PvpSignups(commands.Bot):
             command_string += '> '
         return f"**{command_string}**"
 
-    @tasks.loop(hours=1)
+    @tasks.loop(minutes=10)
     async def cleanup(self):
         await Booking.cleanup()
 
+    @staticmethod
+    def flush():
+        """Writes the in-memory profile cache, bad luck protection weights, pending config changes and deadlines back to disk"""
+        flush_configs()
+        scheduler.flush()
+        profiles.save()
+        for weights in iweights.values():
+            weights.flush()
+
+    @tasks.loop(minutes=10)
+    async def flush_caches(self):
+        self.flush()
+
+    @tasks.loop(seconds=5)
+    async def watch_configs(self):
+        reload_configs()
+
 
 def main():
     bot = PvpSignups()
@@ -0,0 +1,58 @@
+from utils.archive import BookingArchive
+
+
+def record(booking_id, type_="1 win", price_recommendation=90000):
+    return {
+        "v": 1, "id": booking_id, "instance": "developer", "author": 170793631102402560, "bracket": "3v3",
+        "status": 6, "type": type_,
+        "buyer": {"name": "Lnrs", "realm": "Draenor", "faction": "Horde", "class_": "Mage", "spec": "Fire", "rating": 2100},
+        "price_recommendation": price_recommendation, "ad_price_estimate": price_recommendation, "price": 900000,
+        "booster": {"prim": 282135704392302593, "sec": 745647780864851968, "prim_cut": 346500, "sec_cut": 346500,
+                    "ad_cut": 99000, "mana_cut": 108000},
+        "notes": "N/A", "post_message": None, "timestamp": 1610383009.0249803
+    }
+
+
+def stored(record):
+    """The record as the archive returns it, without the schema version"""
+    return {field: value for field, value in record.items() if field != "v"}
+
+
+def test_gladiator_booking_round_trip():
+    archive = BookingArchive()
+    glad = record("1", "Gladiator", "See glad pricing")
+    archive.add(glad)
+    archive.add(record("2"))
+    assert archive.get("1") == stored(glad)
+    assert archive.get("2") == stored(record("2"))
+
+
+def test_remove_keeps_rows_aligned():
+    archive = BookingArchive()
+    for booking_id in ("1", "2", "3"):
+        archive.add(record(booking_id, "Gladiator", "See glad pricing") if booking_id == "1" else record(booking_id))
+    assert archive.remove("1")
+    assert "1" not in archive and len(archive) == 2
+    assert archive.get("3") == stored(record("3"))
+    assert sorted(archive.instance("developer")) == ["2", "3"]
+
+
+def test_filter_and_values_by_column():
+    archive = BookingArchive()
+    archive.add(record("1"))
+    archive.add({**record("2"), "status": 4, "post_message": 799999999999999999})
+    assert archive.filter(instance="developer", status=6) == ["1"]
+    assert archive.filter(bracket="2v2") == []
+    assert archive.value("2", "post_message") == 799999999999999999
+    assert archive.value("1", "prim") == 282135704392302593
+    assert archive.value("1", "name") == "Lnrs"
+    assert archive.count("status", "developer") == {6: 1, 4: 1}
+
+
+def test_copy_is_unaffected_by_later_changes():
+    archive = BookingArchive()
+    archive.add(record("1"))
+    copy = archive.copy()
+    archive.remove("1")
+    archive.add(record("2"))
+    assert copy.get("1") == stored(record("1")) and "2" not in copy
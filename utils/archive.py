@@ -0,0 +1,190 @@
+from collections import Counter
+from array import array
+import math
+
+numeric_fields = ("timestamp", "price", "price_recommendation", "ad_price_estimate", "prim_cut", "sec_cut", "ad_cut", "mana_cut")
+symbol_fields = ("instance", "bracket", "status", "type", "realm", "faction", "class_", "spec", "rating")
+reference_fields = ("author", "prim", "sec", "post_message")
+text_fields = ("name", "notes")
+buyer_fields = ("name", "realm", "faction", "class_", "spec", "rating")
+booster_fields = ("prim", "sec", "prim_cut", "sec_cut", "ad_cut", "mana_cut")
+
+
+class BookingArchive(object):
+    """Column oriented storage of completed bookings that are no longer expected to change
+
+    Numbers are kept in ``array('d')`` columns (None as NaN, whole numbers come back as ints),
+    discord IDs in ``array('q')`` columns (None as 0), repeated values such as instances, brackets
+    and realms are stored once in a symbol table and referenced by index. Only the booking ID,
+    buyer name and notes are kept as objects per row. Values that don't fit their column, such as
+    the price recommendation of gladiator bookings, are kept in :attr:`overflow`.
+
+    Attributes
+    -----------
+    rows: :class:`dict`
+        The row of each archived booking, keyed by booking ID.
+    ids: :class:`list`
+        The booking ID of each row.
+    symbols: :class:`list`
+        Every distinct value of the symbol columns.
+    overflow: :class:`dict`
+        The values that don't fit their column, keyed by row.
+    version: :class:`int`
+        Incremented whenever a booking is added or removed.
+    dirty: :class:`set`
+        The instances whose archived bookings changed since they were last saved.
+    """
+    def __init__(self):
+        self.rows = {}
+        self.ids = []
+        self.symbols = []
+        self._symbol_index = {}
+        self.numeric = {field: array("d") for field in numeric_fields}
+        self.symbolic = {field: array("I") for field in symbol_fields}
+        self.references = {field: array("q") for field in reference_fields}
+        self.text = {field: [] for field in text_fields}
+        self.overflow = {}
+        self.version = 0
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, booking_id):
+        return booking_id in self.rows
+
+    def __iter__(self):
+        return iter(list(self.ids))
+
+    def add(self, record):
+        """Archives a booking record (see :meth:`Booking.to_dict`), replacing any archived booking with the same ID"""
+        self.remove(record["id"])
+        flat = {**record, **record["buyer"], **record["booster"]}
+        # the whole row is built before any column is touched, so a bad value can't leave the columns misaligned
+        numbers, references, overflow = [], [], {}
+        for field in numeric_fields:
+            value = flat.get(field)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                overflow[field] = value
+                value = None
+            numbers.append(math.nan if value is None else float(value))
+        for field in reference_fields:
+            value = flat.get(field)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int) or not 0 < value < 2 ** 63):
+                overflow[field] = value
+                value = None
+            references.append(value or 0)
+        symbols = [self._symbol(flat.get(field)) for field in symbol_fields]
+        text = [flat.get(field) for field in text_fields]
+        for column, value in zip(self.numeric.values(), numbers):
+            column.append(value)
+        for column, value in zip(self.references.values(), references):
+            column.append(value)
+        for column, value in zip(self.symbolic.values(), symbols):
+            column.append(value)
+        for column, value in zip(self.text.values(), text):
+            column.append(value)
+        self.ids.append(record["id"])
+        row = self.rows[record["id"]] = len(self.ids) - 1
+        if overflow:
+            self.overflow[row] = overflow
+        self.version += 1
+        self.dirty.add(flat.get("instance"))
+
+    def get(self, booking_id):
+        """:class:Optional[`dict`] The record of an archived booking"""
+        row = self.rows.get(booking_id)
+        if row is None:
+            return None
+        flat = {"id": booking_id}
+        for field, column in self.text.items():
+            flat[field] = column[row]
+        for field, column in self.numeric.items():
+            value = column[row]
+            flat[field] = None if math.isnan(value) else int(value) if value.is_integer() else value
+        for field, column in self.references.items():
+            flat[field] = column[row] or None
+        flat.update(self.overflow.get(row, {}))
+        for field, column in self.symbolic.items():
+            flat[field] = self.symbols[column[row]]
+        record = {field: flat[field] for field in flat if field not in buyer_fields and field not in booster_fields}
+        record["buyer"] = {field: flat[field] for field in buyer_fields}
+        record["booster"] = {field: flat[field] for field in booster_fields}
+        return record
+
+    def value(self, booking_id, field):
+        """The value of a single top level, buyer or booster field of an archived booking, without decoding the rest of its row"""
+        row = self.rows[booking_id]
+        overflow = self.overflow.get(row)
+        if overflow and field in overflow:
+            return overflow[field]
+        if field in self.symbolic:
+            return self.symbols[self.symbolic[field][row]]
+        if field in self.numeric:
+            value = self.numeric[field][row]
+            return None if math.isnan(value) else int(value) if value.is_integer() else value
+        if field in self.references:
+            return self.references[field][row] or None
+        return self.text[field][row]
+
+    def remove(self, booking_id):
+        """Removes an archived booking by moving the last row into its place"""
+        row = self.rows.pop(booking_id, None)
+        if row is None:
+            return False
+        self.dirty.add(self.symbols[self.symbolic["instance"][row]])
+        last = len(self.ids) - 1
+        for column in [*self.numeric.values(), *self.symbolic.values(), *self.references.values(), *self.text.values(), self.ids]:
+            column[row] = column[last]
+            column.pop()
+        overflow = self.overflow.pop(last, None)
+        if row != last:
+            self.overflow.pop(row, None)
+            if overflow:
+                self.overflow[row] = overflow
+            self.rows[self.ids[row]] = row
+        self.version += 1
+        return True
+
+    def filter(self, instance=None, status=None, bracket=None):
+        """:class:`list` The IDs of the archived bookings matching every given criteria"""
+        criteria = [(self.symbolic[field], self._symbol_index.get(value))
+                    for field, value in (("instance", instance), ("status", status), ("bracket", bracket)) if value is not None]
+        if any(symbol is None for column, symbol in criteria):
+            return []
+        return [booking_id for row, booking_id in enumerate(self.ids) if all(column[row] == symbol for column, symbol in criteria)]
+
+    def instance(self, instname):
+        """:class:`list` The IDs of the archived bookings of an instance"""
+        return self.filter(instance=instname)
+
+    def count(self, field, instance=None):
+        """:class:`collections.Counter` The number of archived bookings with each value of a symbol field"""
+        column = self.symbolic[field]
+        if instance is None:
+            return Counter(self.symbols[index] for index in column)
+        symbol, instances = self._symbol_index.get(instance), self.symbolic["instance"]
+        return Counter(self.symbols[column[row]] for row in range(len(self.ids)) if instances[row] == symbol)
+
+    def copy(self):
+        """:class:`BookingArchive` A copy of the archive that later changes don't affect, the columns are copied
+        as a whole so it's cheap enough to take on the event loop and read from another thread"""
+        archive = BookingArchive()
+        archive.rows = dict(self.rows)
+        archive.ids = list(self.ids)
+        archive.symbols = list(self.symbols)
+        archive._symbol_index = dict(self._symbol_index)
+        archive.numeric = {field: column[:] for field, column in self.numeric.items()}
+        archive.symbolic = {field: column[:] for field, column in self.symbolic.items()}
+        archive.references = {field: column[:] for field, column in self.references.items()}
+        archive.text = {field: list(column) for field, column in self.text.items()}
+        archive.overflow = dict(self.overflow)
+        archive.version = self.version
+        return archive
+
+    def _symbol(self, value):
+        index = self._symbol_index.get(value)
+        if index is None:
+            index = self._symbol_index[value] = len(self.symbols)
+            self.symbols.append(value)
+        return index
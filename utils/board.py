@@ -0,0 +1,256 @@
+from utils.misc import base_embed, get_logger
+from utils.config import cfg, data
+from utils.messages import message_cache
+from utils import metrics
+
+import discord
+
+from bisect import bisect_right
+import asyncio
+import datetime
+import re
+
+logger = get_logger("PvpSignups")
+field_id_pattern = re.compile(r"ID: ``(\d+)``")
+embed_char_limit = 5500
+
+
+def render_field(booking, previous=None):
+    """:class:`tuple` The (name, value) of the untaken board field for a booking,
+    the name is a spec heading if the previous booking on the board is a different spec"""
+    b = booking
+    value = f'ID: ``{b.id}``Author: <@{b.authorid}> \n ' \
+            f'Boost info: ``{b.bracket} {b.type} {b.buyer.rating}`` {b.format_price_estimate()}\n ' \
+            f'Buyer info: [{b.buyer.name}-{b.buyer.realm}](https://check-pvp.fr/eu/{b.buyer.realm.replace(" ", "%20")}/{b.buyer.name}) ' \
+            f'{getattr(cfg, b.buyer.faction.lower() + "_emoji")}' \
+            f'{data.spec_emotes[b.buyer.class_][b.buyer.spec]}\n' \
+            f'Created: ``{datetime.datetime.utcfromtimestamp(b.timestamp).strftime("%d/%m %H:%M") if b.timestamp else "N/A"}`` \nNotes: ``{b.notes}``'
+    if previous is None or (previous.buyer.class_, previous.buyer.spec) != (b.buyer.class_, b.buyer.spec):
+        name = f"\u200b\n{data.spec_emotes[b.buyer.class_][b.buyer.spec]}__**{b.buyer.spec} {b.buyer.class_} bookings**__"
+    else:
+        name = "\u200b"
+    return name, value
+
+
+def page_chars(page, fields):
+    """:class:`int` The number of characters the fields of a page take up in its embed"""
+    return sum(len(name) + len(value) for name, value in (fields[booking_id] for booking_id in page))
+
+
+class UntakenBoard(object):
+    """The untaken boosts board of one bracket of an instance
+
+    The board remembers which bookings are on each page and the fields each page was last rendered with,
+    a refresh only inserts or removes the bookings that changed and only edits the pages whose fields differ.
+    Pages that shrink below ``min_page_length`` are merged into the page before them when the two fit on one.
+    Refreshes are requested through :meth:`request_refresh`, requests made within ``delay`` seconds of each other
+    share a single render and only one render of the board is ever in flight.
+
+    Attributes
+    -----------
+    messages: :class:`list`
+        The messages of the board in the order they appear in the channel.
+    pages: :class:`list`
+        The booking IDs shown on each message.
+    rendered: :class:`list`
+        Whether each message carries the board heading and the (name, value) fields it currently displays.
+    source: :class:`Callable`
+        Returns the sorted untaken bookings the board should show when a scheduled refresh runs.
+    on_change: :class:Optional[`Callable`]
+        Called with the board after a refresh created or deleted messages.
+    """
+    def __init__(self, instname, bracket, channel, messages, source, on_change=None,
+                 page_length=10, max_page_length=15, min_page_length=None, concurrency=4, delay=1.0):
+        self.instname = instname
+        self.bracket = bracket
+        self.channel = channel
+        self.source = source
+        self.on_change = on_change
+        self.page_length = page_length
+        self.max_page_length = max_page_length
+        self.min_page_length = page_length // 2 if min_page_length is None else min_page_length
+        self.concurrency = concurrency
+        self.delay = delay
+        self.messages = []
+        self.pages = []
+        self.rendered = []
+        self._pending = None
+        self._task = None
+        self._deleted = set()
+        for message in messages:
+            self.add_message(message)
+
+    @property
+    def message_ids(self):
+        return [message.id for message in self.messages]
+
+    def add_message(self, message):
+        """Adds an existing board message, the bookings on it are read back from its fields"""
+        fields = [(f.name, f.value) for f in message.embeds[0].fields] if message.embeds else []
+        self.pages.append([m.group(1) for m in (field_id_pattern.search(value) for _, value in fields) if m])
+        self.rendered.append((not self.messages, fields))
+        self.messages.append(message)
+        message_cache.put(message)
+
+    def discard_message(self, message_id):
+        """:class:`bool` Drops a board message that was deleted by someone else on the next refresh,
+        the bookings it showed are placed on the remaining pages"""
+        if message_id not in self.message_ids:
+            return False
+        self._deleted.add(message_id)
+        self.request_refresh()
+        return True
+
+    def request_refresh(self):
+        """:class:`asyncio.Future` Schedules a refresh of the board, resolved once a render covering this request has finished"""
+        if self._pending is None:
+            self._pending = asyncio.get_event_loop().create_future()
+            self._pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+            if self._task is None or self._task.done():
+                self._task = asyncio.ensure_future(self._run())
+        return self._pending
+
+    async def _run(self):
+        while self._pending is not None:
+            await asyncio.sleep(self.delay)
+            future, self._pending = self._pending, None
+            try:
+                if await self.refresh(self.source()) and self.on_change:
+                    self.on_change(self)
+            except Exception as e:
+                logger.error(f"Failed to refresh untaken board {self.instname} {self.bracket}: {e!r}", extra={"instance": self.instname})
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    def layout(self, bookings, fields):
+        """:class:`list` Assigns the bookings to pages, keeping bookings on the page they are already on where possible
+
+        The returned pages line up with :attr:`messages`, an empty page means that message is no longer needed.
+        """
+        position = {b.id: i for i, b in enumerate(bookings)}
+        kept = [[booking_id for booking_id in page if booking_id in position] for page in self.pages]
+        kept_positions = [position[booking_id] for page in kept for booking_id in page]
+        if kept_positions != sorted(kept_positions) or not kept_positions:
+            return self._flow(bookings, 0, [])
+
+        pages = [[] for _ in kept]
+        occupied = [i for i, page in enumerate(kept) if page]
+        first_positions = [position[kept[i][0]] for i in occupied[1:]]
+        for b in bookings:
+            pages[occupied[bisect_right(first_positions, position[b.id])]].append(b.id)
+
+        for i, page in enumerate(pages):
+            if len(page) > self.max_page_length or page_chars(page, fields) > embed_char_limit:
+                return self._flow(bookings, sum(len(p) for p in pages[:i]), pages[:i])
+        return self._merge(pages, fields)
+
+    def _merge(self, pages, fields):
+        """Folds sparse pages into the previous non-empty page, the merged page is left empty so its message is deleted"""
+        merged = []
+        previous = None
+        for page in pages:
+            if page and previous is not None and min(len(previous), len(page)) < self.min_page_length \
+                    and len(previous) + len(page) <= self.page_length and page_chars(previous + page, fields) <= embed_char_limit:
+                previous.extend(page)
+                merged.append([])
+                continue
+            merged.append(page)
+            if page:
+                previous = page
+        return merged
+
+    def _flow(self, bookings, start, pages):
+        ids = [b.id for b in bookings[start:]]
+        return pages + [ids[i:i + self.page_length] for i in range(0, len(ids), self.page_length)]
+
+    async def refresh(self, bookings):
+        """Brings the board in line with the given (sorted) untaken bookings
+
+        Returns
+        -----------
+        :class:`bool`
+            True if messages were created or deleted and the stored message IDs need saving.
+        """
+        with metrics.board_refresh_duration.time(instance=self.instname, bracket=self.bracket):
+            return await self._refresh(bookings)
+
+    async def _refresh(self, bookings):
+        deleted = [i for i, message in enumerate(self.messages) if message.id in self._deleted]
+        for i in reversed(deleted):
+            del self.messages[i], self.pages[i], self.rendered[i]
+        self._deleted.clear()
+
+        fields = {}
+        for i, b in enumerate(bookings):
+            fields[b.id] = render_field(b, bookings[i - 1] if i else None)
+        if bookings:
+            pages = self.layout(bookings, fields)
+            page_fields = [[fields[booking_id] for booking_id in page] for page in pages]
+        else:
+            pages, page_fields = [[]], [[("\u200b", "There are currently no untaken boosts")]]
+
+        keep = [i for i in range(min(len(pages), len(self.messages))) if page_fields[i]]
+        delete = [i for i in range(len(self.messages)) if i not in keep]
+        send = [i for i in range(len(self.messages), len(pages)) if page_fields[i]]
+        new_rendered = {}
+        for page_num, i in enumerate(keep + send):
+            new_rendered[i] = (page_num == 0, page_fields[i])
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        edited, skipped = [], []
+
+        async def edit(i):
+            if self.rendered[i] == new_rendered[i]:
+                skipped.append(self.messages[i].id)
+                return True
+            async with semaphore:
+                try:
+                    await self.messages[i].edit(embed=self._embed(*new_rendered[i]))
+                    edited.append(self.messages[i].id)
+                    return True
+                except discord.NotFound:
+                    logger.error(f"Tried to edit untaken message {self.messages[i].id} that was not there")
+                    return False
+
+        async def remove(i):
+            async with semaphore:
+                try:
+                    logger.info(f"Deleting unnecessary untaken message: {self.messages[i].id}")
+                    message_cache.invalidate(self.messages[i].id)
+                    await self.messages[i].delete()
+                except discord.NotFound:
+                    logger.warning("Tried to delete untaken message that didnt exist")
+
+        results = await asyncio.gather(*[edit(i) for i in keep], *[remove(i) for i in delete])
+        found = [i for i, ok in zip(keep, results) if ok]
+        structure_changed = bool(deleted) or len(found) != len(self.messages)
+        messages = [self.messages[i] for i in found]
+        self.pages = [pages[i] for i in found]
+        self.rendered = [new_rendered[i] for i in found]
+        self.messages = messages
+
+        # new pages have to be sent one at a time so they stay in order
+        for i in send:
+            message = await self.channel.send(embed=self._embed(*new_rendered[i]))
+            logger.info(f"Created new untaken message {message.id}")
+            message_cache.put(message)
+            self.messages.append(message)
+            self.pages.append(pages[i])
+            self.rendered.append(new_rendered[i])
+            structure_changed = True
+
+        for result, count in (("edited", len(edited)), ("skipped", len(skipped)), ("deleted", len(delete)), ("created", len(send))):
+            metrics.board_pages.inc(count, instance=self.instname, bracket=self.bracket, result=result)
+        logger.info(f"Untaken board {self.instname} {self.bracket}: {len(edited)} page(s) edited, {len(skipped)} skipped", extra={"instance": self.instname})
+        return structure_changed
+
+    @staticmethod
+    def _embed(first, fields):
+        if first:
+            embed = base_embed(f"Type ``{cfg.command_prefix}take <ID> <mention teammate if 3v3>`` to claim a boost", title="Untaken boosts")
+        else:
+            embed = base_embed("")
+        for name, value in fields:
+            embed.add_field(name=name, value=value, inline=False)
+        return embed
@@ -1,31 +1,77 @@
 from utils import pricing
-from utils.misc import base_embed, get_logger
+from utils.misc import base_embed, get_logger, handling_booking
 from utils.request import request
+from utils.profiles import profiles
 from utils import exceptions
 from utils.config import cfg, icfg, data
+from utils.store import istore
+from utils import codec
+from utils.registry import BookingRegistry
+from utils.archive import BookingArchive
+from utils.expiry import ExpiryIndex
+from utils.snapshot import BookingSnapshot
+from utils.feed import ChangeFeed
+from utils.sheets import SheetSync
+from utils.board import UntakenBoard
+from utils.messages import message_cache
+from utils.scheduler import scheduler
+from utils.weights import iweights
+from utils import metrics
 
 from discord.ext import commands
 import discord
 
+from enum import IntEnum
 import string
+import sys
 import uuid
 import asyncio
-import json
-import jsonpickle
+from collections import defaultdict
 import random
 import time
-import datetime
-import itertools
+import functools
 
 logger = get_logger("PvpSignups")
 statuses = ['Compiling', 'Posted', 'Pending (not uploaded)', 'Pending', 'Refund', 'Partial refund', 'Complete', 'Untaken']
 
 
+class Status(IntEnum):
+    """Booking statuses, named by :data:`statuses` and interchangeable with the plain ints used before"""
+    compiling = 0
+    posted = 1
+    pending_not_uploaded = 2
+    pending = 3
+    refund = 4
+    partial_refund = 5
+    complete = 6
+    untaken = 7
+
+
+completed_statuses = (Status.refund, Status.partial_refund, Status.complete)
+in_flight_statuses = (Status.compiling, Status.posted, Status.pending_not_uploaded)
+sheet_statuses = (Status.pending_not_uploaded, Status.pending) + completed_statuses
+sheet_columns = ["ID", "Date", "Instance", "Advertiser", "Bracket", "Type", "Buyer", "Faction", "Class", "Spec", "Rating",
+                 "Price", "Booster", "Teammate", "Booster cut", "Teammate cut", "Advertiser cut", "Management cut", "Status", "Notes"]
+
+
+def booking_ttl(instname):
+    """:class:`float` The number of seconds the bookings of an instance are kept for, ``booking_ttl`` in the
+    instance config or the main config, two days by default"""
+    return getattr(icfg[instname], "booking_ttl", getattr(cfg, "booking_ttl", 172800))
+
+
 # noinspection PyUnresolvedReferences
 class Booking(object):
-    instances = {instname: [] for instname in icfg.keys()}
+    __slots__ = ("instance", "_author", "_bracket", "_status", "id", "type", "buyer", "price_recommendation",
+                 "ad_price_estimate", "price", "booster", "notes", "post_message", "timestamp")
+    registry = BookingRegistry(icfg.keys())
+    archive = BookingArchive()
+    expiry = ExpiryIndex(registry, booking_ttl)
+    snapshot = BookingSnapshot(registry, archive)
+    feed = ChangeFeed(registry)
+    sheets = SheetSync(registry, sheet_columns, lambda booking: booking.status in sheet_statuses)
     client = None
-    untaken_messages = {}
+    untaken_boards = {}
     post_channels = {}
     request_channels = {}
     untaken_channels = {}
@@ -33,190 +79,298 @@ class Booking(object):
     def __init__(self, bracket, author: discord.User, instname):
         if instname not in icfg.keys():
             raise exceptions.UnsupportedInstanceType
-        self.__class__.instances[instname].append(self)
         self.instance = instname
         self._author = author
-        self.bracket = bracket
-        self.status = 0
+        self._bracket = sys.intern(bracket)
+        self._status = Status.compiling
         self.id = str(uuid.uuid1().int)[:10]
         self.type = None
         self.buyer = Buyer()
         self.price_recommendation = None
         self.ad_price_estimate = None
         self.price = 0
-        self.booster = Booster(instname)
+        self.booster = Booster()
         self.notes = None
         self.post_message = None
         self.timestamp = time.time()
+        self.registry.add(self)
+
+    @property
+    def status(self) -> Status:
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        value = Status(value)
+        old, self._status = getattr(self, "_status", None), value
+        if self.registered and old != value:
+            self.registry.reindex(self, "status", old, value)
+
+    @property
+    def bracket(self) -> str:
+        return self._bracket
+
+    @bracket.setter
+    def bracket(self, value):
+        value = sys.intern(value)
+        old, self._bracket = getattr(self, "_bracket", None), value
+        if self.registered and old != value:
+            self.registry.reindex(self, "bracket", old, value)
+
+    @property
+    def registered(self) -> bool:
+        return hasattr(self, "id") and self in self.registry
 
     @classmethod
     async def load(cls, client):
+        """Loads every instance concurrently, message fetches are bounded by ``startup_concurrency`` across all instances"""
         cls.client = client
-        for instname, instconfig in icfg.items():
-            logger.info(f"----- Begin loading instance {instname}: -----")
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(getattr(cfg, "startup_concurrency", 8))
+        await asyncio.gather(*[cls._load_instance(instname, instconfig, semaphore) for instname, instconfig in icfg.items()])
+        scheduler.start()
+        logger.info(f"Loaded {len(icfg)} instance(s) in {time.perf_counter() - started:.2f}s")
 
-            cls.request_channels[instname] = commands.Bot.get_channel(cls.client, instconfig.request_channel)
-            if cls.request_channels[instname] is None:
+    @classmethod
+    async def _load_instance(cls, instname, instconfig, semaphore):
+        logger.info(f"----- Begin loading instance {instname}: -----")
+        timings = {}
+        phase_start = time.perf_counter()
+
+        cls.request_channels[instname] = commands.Bot.get_channel(cls.client, instconfig.request_channel)
+        if cls.request_channels[instname] is None:
+            raise exceptions.ChannelNotFound
+
+        cls.post_channels[instname] = {
+            "2v2": commands.Bot.get_channel(cls.client, instconfig.post_2v2),
+            "3v3": commands.Bot.get_channel(cls.client, instconfig.post_3v3),
+            "glad": commands.Bot.get_channel(cls.client, instconfig.post_glad)
+        }
+        for channel in cls.post_channels[instname].values():
+            if channel is None:
                 raise exceptions.ChannelNotFound
 
-            cls.post_channels[instname] = {
-                "2v2": commands.Bot.get_channel(cls.client, instconfig.post_2v2),
-                "3v3": commands.Bot.get_channel(cls.client, instconfig.post_3v3),
-                "glad": commands.Bot.get_channel(cls.client, instconfig.post_glad)
-            }
-            for channel in cls.post_channels[instname].values():
-                if channel is None:
-                    raise exceptions.ChannelNotFound
-
-            cls.untaken_channels[instname] = {
-                "2v2": commands.Bot.get_channel(cls.client, instconfig.untaken_channels["2v2"]),
-                "3v3": commands.Bot.get_channel(cls.client, instconfig.untaken_channels["3v3"])
-            }
-            for channel in cls.untaken_channels[instname].values():
-                if channel is None:
-                    raise exceptions.ChannelNotFound
-
-            try:
-                await cls.request_channels[instname].fetch_message(instconfig.request_message)
-                logger.info("Successfully located request message")
-            except discord.NotFound:
-                logger.warning("No valid request message was found in the request booking channel, automatically creating...")
-                request_message = await cls.request_channels[instname].send(f"React with {cfg.twos_emoji} to create a 2v2 booking or {cfg.threes_emoji} to create a 3v3 booking")
-                await request_message.add_reaction(cfg.twos_emoji)
-                await request_message.add_reaction(cfg.threes_emoji)
-                instconfig.set("request_message", request_message.id)
-                instconfig.update()
-
-            cls.untaken_messages[instname] = {}
-            for bracket, messages in instconfig.untaken_messages.items():
-                cls.untaken_messages[instname][bracket] = []
-                for message_id in messages:
-                    try:
-                        cls.untaken_messages[instname][bracket].append(await cls.untaken_channels[instname][bracket].fetch_message(message_id))
-                        logger.info(f"Located untaken boost message ID: {message_id}")
-                    except discord.NotFound:
-                        instconfig.untaken_messages[bracket].remove(message_id)
-                        instconfig.update()
-                        logger.info(f"disgarding unlocatable untaken boost message ID: {message_id}")
-
-            cache = json.load(open(f"{instconfig.directory}/bookings.json", "r"))
-            for _instance in cache.values():
-                instance = jsonpickle.decode(_instance)
-                instance.__class__.instances[instname].append(instance)
-            logger.info(f"{len(cls.instances[instname])} booking(s) have been loaded from the {instname} cache")
-            logger.info(f"----- Finished loading instance: {instname} -----")
+        cls.untaken_channels[instname] = {
+            "2v2": commands.Bot.get_channel(cls.client, instconfig.untaken_channels["2v2"]),
+            "3v3": commands.Bot.get_channel(cls.client, instconfig.untaken_channels["3v3"])
+        }
+        for channel in cls.untaken_channels[instname].values():
+            if channel is None:
+                raise exceptions.ChannelNotFound
+        timings["channels"] = time.perf_counter() - phase_start
+
+        # decoding the cache doesn't depend on any message, so it runs in the executor while the messages are fetched
+        phase_start = time.perf_counter()
+        cache_future = asyncio.get_event_loop().run_in_executor(None, cls._read_cache, instname)
+
+        async def fetch(channel, message_id):
+            async with semaphore:
+                try:
+                    return await channel.fetch_message(message_id)
+                except discord.NotFound:
+                    return None
+
+        brackets = list(instconfig.untaken_messages.keys())
+        request_message, *untaken_results = await asyncio.gather(
+            fetch(cls.request_channels[instname], instconfig.request_message),
+            *[asyncio.gather(*[fetch(cls.untaken_channels[instname][bracket], message_id)
+                               for message_id in instconfig.untaken_messages[bracket]])
+              for bracket in brackets])
+        timings["messages"] = time.perf_counter() - phase_start
+
+        config_changed = False
+        if request_message is not None:
+            message_cache.put(request_message)
+            logger.info("Successfully located request message")
+        else:
+            logger.warning("No valid request message was found in the request booking channel, automatically creating...")
+            request_message = await cls.request_channels[instname].send(f"React with {cfg.twos_emoji} to create a 2v2 booking or {cfg.threes_emoji} to create a 3v3 booking")
+            await request_message.add_reaction(cfg.twos_emoji)
+            await request_message.add_reaction(cfg.threes_emoji)
+            message_cache.put(request_message)
+            instconfig.set("request_message", request_message.id)
+            config_changed = True
+
+        cls.untaken_boards[instname] = {}
+        for bracket, results in zip(brackets, untaken_results):
+            untaken_messages = []
+            for message_id, message in zip(list(instconfig.untaken_messages[bracket]), results):
+                if message is not None:
+                    untaken_messages.append(message)
+                    logger.info(f"Located untaken boost message ID: {message_id}")
+                else:
+                    instconfig.untaken_messages[bracket].remove(message_id)
+                    config_changed = True
+                    logger.info(f"disgarding unlocatable untaken boost message ID: {message_id}")
+            cls.untaken_boards[instname][bracket] = UntakenBoard(
+                instname, bracket, cls.untaken_channels[instname][bracket], untaken_messages,
+                source=functools.partial(cls.registry.sorted, instname, bracket, 7),
+                on_change=cls._save_untaken_messages,
+                page_length=getattr(cfg, "untaken_page_length", 10),
+                max_page_length=getattr(cfg, "untaken_max_page_length", 15),
+                min_page_length=getattr(cfg, "untaken_min_page_length", None),
+                concurrency=getattr(cfg, "untaken_edit_concurrency", 4),
+                delay=getattr(cfg, "untaken_refresh_delay", 1.0))
+        if config_changed:
+            instconfig.update()
+
+        phase_start = time.perf_counter()
+        bookings, archived, stale = await cache_future
+        # loaded bookings aren't changes, publishing them would flush the feed's replay history on every start
+        with cls.feed.muted():
+            for booking in bookings:
+                cls.registry.add(booking)
+        # archived bookings are loaded straight into the archive's columns, without decoding them
+        for record in archived:
+            cls.archive.add(record)
+            cls.expiry.push(instname, record["id"], (record["timestamp"] or 0) + cls.expiry.ttl(instname))
+        if not stale:
+            cls.archive.dirty.discard(instname)
+        timings["cache"] = time.perf_counter() - phase_start
+        logger.info(f"{len(cls.registry.by_instance[instname])} booking(s) and {len(archived)} archived booking(s) "
+                    f"have been loaded from the {instname} cache")
+        scheduler.load(instname, keys={"reroll": cls._reroll_key})
+        logger.info(f"Loading {instname} took " + ", ".join(f"{phase}: {seconds:.2f}s" for phase, seconds in timings.items()), extra={"instance": instname})
+        logger.info(f"----- Finished loading instance: {instname} -----")
+
+    @staticmethod
+    def _read_cache(instname):
+        """:class:`tuple` The decoded bookings of an instance's store, the records of its archived bookings and
+        whether the saved archive holds bookings the store has a newer record of, run in an executor as decoding is CPU bound"""
+        store = istore[instname]
+        records = store.load()
+        archive = store.load_archive()
+        # a booking that changed after it was archived is live again, its stored record is the latest
+        archived = [record for booking_id, record in archive.items() if booking_id not in records]
+        return [Booking.from_dict(record) for record in records.values()], archived, len(archived) != len(archive)
 
     @classmethod
     def get(cls, bookingid):
-        for instance in cls.joined_instances():
-            if instance.id == bookingid:
-                return instance
+        booking = cls.registry.get(bookingid)
+        if booking is not None:
+            return booking
+        record = cls.archive.get(bookingid)
+        if record is not None:
+            return cls.from_dict(record)
         raise exceptions.RequestFailed(f"No booking was found with ID ``{bookingid}``")
 
     @classmethod
-    async def update_untaken_boosts(cls, instname):
+    def filter(cls, instance=None, status=None, bracket=None):
+        """:class:`list` Registered and archived bookings matching every given criteria, see :meth:`BookingRegistry.filter`,
+        archived bookings are decoded so prefer filtering :attr:`archive` by column when only a few fields are needed"""
+        archived = [cls.from_dict(cls.archive.get(booking_id)) for booking_id in cls.archive.filter(instance, status, bracket)]
+        return cls.registry.filter(instance, status, bracket) + archived
+
+    @classmethod
+    async def update_untaken_boosts(cls, instname, bracket=None, wait=True):
+        """Requests a refresh of the untaken boards of an instance (or only the given bracket),
+        requests made in quick succession are coalesced into a single refresh per board
+
+        Parameters
+        -----------
+        wait: :class:`bool`
+            If True, returns once the refresh has finished rather than as soon as it is scheduled.
+        """
         if instname not in icfg.keys():
             logger.error(f"Failed to update untaken boosts for: {instname} - no instance found matching that name")
-        page_length = 10
-        instconfig = icfg[instname]
-        logger.info(f"----- Begin updating untaken boosts for {instname} -----")
-        embed = base_embed(f"Type ``{cfg.command_prefix}take <ID> <mention teammate if 3v3>`` to claim a boost", title="Untaken boosts")
-        untaken_brackets = {
-            "2v2": [],
-            "3v3": []
-            }
-        for booking in Booking.instances[instname]:
-            if booking.status == 7:
-                if booking.bracket == "2v2":
-                    untaken_brackets["2v2"].append(booking)
-                elif booking.bracket == "3v3":
-                    untaken_brackets["3v3"].append(booking)
-        for bracket, untaken_boosts in untaken_brackets.items():
-            untaken_boosts.sort(key=lambda b_sort: (b_sort.buyer.class_, b_sort.buyer.spec))
-            untaken_pages = [untaken_boosts[i:i + page_length] for i in range(0, len(untaken_boosts), page_length)]
-            if len(untaken_pages) < len(cls.untaken_messages[instname][bracket]):
-                for message in cls.untaken_messages[instname][bracket][len(untaken_pages):]:
-                    try:
-                        instconfig.untaken_messages[bracket].remove(message.id)
-                        instconfig.update()
-                        logger.info(f"Deleting unnecessary untaken message: {message.id}")
-                        await message.delete()
-                        cls.untaken_messages[instname][bracket].remove(message)
-                    except ValueError:
-                        logger.warning("Tried to delete untaken message that didnt exist")
-
-            for i, page in enumerate(untaken_pages):
-                for n, b in enumerate(page):
-                    edit_required = False
-                    booking_string = f'ID: ``{b.id}``Author: <@{b.authorid}> \n ' \
-                                     f'Boost info: ``{b.bracket} {b.type} {b.buyer.rating}`` {b.format_price_estimate()}\n ' \
-                                     f'Buyer info: [{b.buyer.name}-{b.buyer.realm}](https://check-pvp.fr/eu/{b.buyer.realm.replace(" ", "%20")}/{b.buyer.name}) ' \
-                                     f'{getattr(cfg, b.buyer.faction.lower() + "_emoji")}' \
-                                     f'{data.spec_emotes[b.buyer.class_][b.buyer.spec]}\n' \
-                                     f'Created: ``{datetime.datetime.utcfromtimestamp(b.timestamp).strftime("%d/%m %H:%M") if b.timestamp else "N/A"}`` \nNotes: ``{b.notes}``'
-                    if untaken_boosts[(i * page_length) + n - 1].buyer.spec != b.buyer.spec:
-                        embed_title = f"\u200b\n{data.spec_emotes[b.buyer.class_][b.buyer.spec]}__**{b.buyer.spec} {b.buyer.class_} bookings**__"
-                    else:
-                        embed_title = "\u200b"
-                    if not (len(cls.untaken_messages[instname][bracket]) > i and len(cls.untaken_messages[instname][bracket][i].embeds[0].fields) > n):
-                        edit_required = True
-                    elif booking_string != cls.untaken_messages[instname][bracket][i].embeds[0].fields[n].value \
-                            or embed_title != cls.untaken_messages[instname][bracket][i].embeds[0].fields[n].name:
-                        edit_required = True
-                    embed.add_field(name=embed_title, value=booking_string, inline=False)
-                if len(cls.untaken_messages[instname][bracket]) >= i or len(embed.fields) != len(cls.untaken_messages[instname][bracket][i].embeds[0].fields):
-                    edit_required = True
-                if not embed.fields:
-                    embed.add_field(name="\u200b", value="There are currently no untaken boosts", inline=False)
-                    break
-                if len(cls.untaken_messages[instname][bracket]) > 0 and len(cls.untaken_messages[instname][bracket])-1 >= i:
-                    if edit_required:
-                        try:
-                            await cls.untaken_messages[instname][bracket][i].edit(embed=embed)
-                            logger.info(f"Edited untaken message: {cls.untaken_messages[instname][bracket][i].id}")
-                        except discord.NotFound:
-                            logger.error("Tried to edit a message that was not there")
-                    else:
-                        logger.info(f"Skipping editing untaken message: {cls.untaken_messages[instname][bracket][i].id}")
-                    embed = base_embed("")
-                else:
-                    new_untaken_page = await cls.untaken_channels[instname][bracket].send(embed=embed)
-                    logger.info(f"Created new untaken message {new_untaken_page.id}")
-                    embed = base_embed("")
-                    cls.untaken_messages[instname][bracket].append(new_untaken_page)
-                    instconfig.untaken_messages[bracket].append(new_untaken_page.id)
-                    instconfig.update()
-        logger.info(f"----- Finished updating untaken boosts for {instname} -----")
+            return
+        boards = cls.untaken_boards[instname]
+        refreshes = [board.request_refresh() for b, board in boards.items() if bracket is None or b == bracket]
+        if wait:
+            await asyncio.shield(asyncio.gather(*refreshes))
+
+    @classmethod
+    def _save_untaken_messages(cls, board):
+        instconfig = icfg[board.instname]
+        instconfig.untaken_messages[board.bracket] = board.message_ids
+        instconfig.update()
 
     @classmethod
     async def cleanup(cls):
-        logger.info("Beginning booking cleanup...")
-        ts = time.time()
-        for instname, insts in cls.instances.items():
-            for i, b in enumerate(insts):
-                if (b.timestamp + 172800) < ts:  # 2 days in seconds
-                    b.delete()
-            # no idea why but it needs to be like this or it only cleans first 2 expired
-            await Booking.update_untaken_boosts(instname)
-        logger.info("Finished booking cleanup")
+        """Deletes the bookings that have outlived their instance's TTL and archives cold completed bookings
+
+        Only the expired entries of :attr:`expiry` are visited, bookings that are still being compiled
+        or waiting on a winner are checked again after ``expiry_interval`` seconds.
+        """
+        now = time.time()
+        expired = defaultdict(list)
+        for instname, booking_id in cls.expiry.due(now):
+            b = cls.registry.get(booking_id)
+            if b is None and booking_id in cls.archive:
+                b = cls.get(booking_id)
+            if b is None:
+                continue
+            if b.status in in_flight_statuses:
+                cls.expiry.push(instname, booking_id, now + getattr(cfg, "expiry_interval", 600))
+                continue
+            expired[instname].append(b)
+        for instname, bookings in expired.items():
+            cls.delete_many(instname, bookings)
+            if any(b.status == Status.untaken for b in bookings):
+                await cls.update_untaken_boosts(instname, wait=False)
+            logger.info(f"Deleted {len(bookings)} expired booking(s) from {instname}", extra={"instance": instname})
+        await cls.archive_cold()
+
+    @classmethod
+    def delete_many(cls, instname, bookings):
+        """Deletes several bookings of an instance with a single store and deadline write"""
+        for b in bookings:
+            scheduler.cancel(b.id, save=False)
+        scheduler.save(instname)
+        istore[instname].delete_many([b.id for b in bookings])
+        for b in bookings:
+            b._unregister()
+        metrics.bookings_deleted.inc(len(bookings), instance=instname)
+
+    @classmethod
+    async def archive_cold(cls):
+        """Moves completed bookings older than ``booking_archive_age`` seconds from the registry and the store into the archive"""
+        cutoff = time.time() - getattr(cfg, "booking_archive_age", 3600)
+        archived = 0
+        for status in completed_statuses:
+            for b in list(cls.registry.by_status[status].values()):
+                if (b.timestamp or 0) < cutoff:
+                    cls.archive.add(b.to_dict())
+                    cls.registry.remove(b, event="archived")
+                    archived += 1
+        if not await cls.save_archive():
+            return
+        # records are only dropped from the store once the archive holding them is on disk,
+        # bookings that changed while it was written are live again and keep theirs
+        for instname, store in istore.items():
+            store.delete_many([booking_id for booking_id in store.records if booking_id in cls.archive])
+        if archived:
+            logger.info(f"Archived {archived} completed booking(s), {len(cls.archive)} booking(s) are archived")
+
+    @classmethod
+    async def save_archive(cls):
+        """:class:`bool` Writes the archived bookings of every instance changed since the last save, the records
+        are encoded and written in the default executor from a copy of the archive"""
+        instnames = [instname for instname in cls.archive.dirty if instname in istore]
+        cls.archive.dirty.clear()
+        if not instnames:
+            return True
+        archive = cls.archive.copy()
+
+        def write():
+            for instname in instnames:
+                records = {booking_id: {"v": codec.schema_version, **archive.get(booking_id)} for booking_id in archive.instance(instname)}
+                istore[instname].save_archive(records)
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, write)
+        except Exception as e:
+            cls.archive.dirty.update(instnames)
+            logger.error(f"Failed to save the archived bookings of {', '.join(instnames)}: {e!r}")
+            return False
+        return True
 
     @classmethod
     def joined_instances(cls):
-        return list(itertools.chain.from_iterable(cls.instances.values()))
+        return list(cls.registry)
 
     @classmethod
     def json_instances(cls):
-        json_instances = {}
-        for b in cls.joined_instances():
-            instance = b.__dict__
-            if isinstance(instance["buyer"], Buyer):
-                instance["buyer"] = instance["buyer"].__dict__
-            if isinstance(instance["booster"], Booster):
-                instance["booster"] = instance["booster"].__dict__
-            if isinstance(instance["post_message"], discord.Message):
-                instance["post_message"] = instance["post_message"].id
-            json_instances[instance["id"]] = instance
-        return json.dumps(json_instances)
+        return cls.snapshot.payload().body.decode("utf-8")
 
     @property
     def author(self) -> discord.User:
@@ -247,24 +401,26 @@ class Booking(object):
 
     async def create(self):
         try:
-            await self.compile()
-            await self.post()
-            await self.pick_winner()
-            self.cache()
+            with handling_booking(self.id, self.instance):
+                await self.compile()
+                await self.post()
+                self.cache()
+            scheduler.schedule(self.instance, self.id, "pick_winner", time.time() + cfg.post_wait_time)
 
         except exceptions.CancelBooking:
             pass
 
     async def compile(self):
-        await self._get_boost_type()
-        await self._get_name_faction_class()
-        await self._get_spec()
-        await self._get_rating_range()
-        await self._get_price_estimate()
-        await self._get_notes()
+        steps = (self._get_boost_type, self._get_name_faction_class, self._get_spec,
+                 self._get_rating_range, self._get_price_estimate, self._get_notes)
+        for step in steps:
+            with metrics.compile_step_duration.time(instance=self.instance, step=step.__name__[5:]):
+                await step()
+            # each step fills in fields of a registered booking, the snapshot and feed need to see them
+            self.registry.notify("updated", self)
 
     async def post(self):
-        logger.info(f"Posting {self.bracket} booking: {self.id}")
+        logger.info(f"Posting {self.bracket} booking: {self.id}", extra={"booking_id": self.id, "instance": self.instance})
         embed = discord.Embed(
             title='New {} booking'.format(self.bracket),
             description='**ID:** ``{}``'.format(self.id),
@@ -292,103 +448,168 @@ class Booking(object):
         self.status = 1
 
     async def pick_winner(self):
-        if self.status == 1:
-            await asyncio.sleep(cfg.post_wait_time)
-            await self._recache_message()
-            reactions = await [i.users() for i in self.post_message.reactions if str(i.emoji) == cfg.take_emoji][0].flatten()
-            reactions = {"users": [str(i.id) for i in reactions if i.bot is False], "time": "now"}
-            if not reactions["users"]:
-                reactions = await [i.users() for i in self.post_message.reactions if str(i.emoji) == cfg.schedule_emoji][0].flatten()
-                reactions = {"users": [str(i.id) for i in reactions if i.bot is False], "time": "schedule"}
-
-                if not reactions["users"]:
-                    untaken_message = f'No users signed up to booking ``{self.id}``, it will be moved to {self.untaken_channels[self.instance][self.bracket].mention}, to claim the boost, type: ``!take {self.id}`` '
-                    await self.post_message.clear_reactions()
-                    if self.bracket == "3v3":
-                        untaken_message += '<Mention teammate> '
-                    untaken_message += f'in {self.untaken_channels[self.instance][self.bracket].mention}'
-                    await self.post_channel.send(embed=base_embed(untaken_message))
-                    await self.author.send(embed=base_embed(f'No users signed up to booking ``{self.id}``, it will be moved to the untaken boosts board'))
-                    self.status = 7
-                    self.post_message = None
-                    self.cache()
-                    await self.update_untaken_boosts(self.instance)
-                    raise exceptions.BookingUntaken
-            await self.post_message.clear_reactions()
-            weight_file = json.load(open(f'{icfg[self.instance].directory}/userweights.json', 'r'))
-            user_weights = weight_file[self.bracket]
-            for user in [x for x in reactions["users"] if x not in user_weights.keys()]:
-                user_weights[str(user)] = 1
-
-            self.booster.prim = random.choices(
-                population=reactions["users"],
-                weights=[0.1 if user_weights[x] < 0 else user_weights[x] for x in reactions["users"]])[0]
-            mention = ', **please mention your teammate**' \
-                      f' within {round(cfg.teammate_pick_timeout / 60)} minutes or the booking will be rerolled' if self.bracket == '3v3' else ''
-            pick_message = f"<@{self.booster.prim}> was picked for {self.author.display_name}'s " \
-                           f"``{self.bracket} {self.type} {self.buyer.rating}`` boost ({reactions['time']}){mention}"
-            await self.post_channel.send(pick_message)
-        else:
+        """Picks the booster from the reactions on the post message, run by the scheduler once the post wait time is over"""
+        if self.status != 1:
             return False
+        with metrics.pick_winner_duration.time(instance=self.instance, bracket=self.bracket):
+            picked = await self._pick_winner()
+        metrics.picks.inc(instance=self.instance, bracket=self.bracket, outcome="picked" if picked else "untaken")
+        return picked
+
+    async def _pick_winner(self):
+        await self._recache_message()
+        reactions = await [i.users() for i in self.post_message.reactions if str(i.emoji) == cfg.take_emoji][0].flatten()
+        reactions = {"users": [str(i.id) for i in reactions if i.bot is False], "time": "now"}
+        if not reactions["users"]:
+            reactions = await [i.users() for i in self.post_message.reactions if str(i.emoji) == cfg.schedule_emoji][0].flatten()
+            reactions = {"users": [str(i.id) for i in reactions if i.bot is False], "time": "schedule"}
 
-        if self.bracket == '3v3' and self.booster.prim:
-            def mention_check(message) -> bool:
-                return message.author == winner_user and message.mentions
-
-            winner_user = commands.Bot.get_user(self.client, int(self.booster.prim))
-            try:
-                winner_message = await commands.Bot.wait_for(self.client, event='message', check=mention_check, timeout=cfg.teammate_pick_timeout)
+            if not reactions["users"]:
+                untaken_message = f'No users signed up to booking ``{self.id}``, it will be moved to {self.untaken_channels[self.instance][self.bracket].mention}, to claim the boost, type: ``!take {self.id}`` '
+                await self.post_message.clear_reactions()
+                if self.bracket == "3v3":
+                    untaken_message += '<Mention teammate> '
+                untaken_message += f'in {self.untaken_channels[self.instance][self.bracket].mention}'
+                await self.post_channel.send(embed=base_embed(untaken_message))
+                await self.author.send(embed=base_embed(f'No users signed up to booking ``{self.id}``, it will be moved to the untaken boosts board'))
+                self.status = 7
+                self.post_message = None
+                self.cache()
+                await self.update_untaken_boosts(self.instance, self.bracket, wait=False)
+                return False
+        await self.post_message.clear_reactions()
+        weights = iweights[self.instance]
+        weights.add_users(self.bracket, reactions["users"])
+        user_weights = [weights.get(self.bracket, x) for x in reactions["users"]]
+
+        self.booster.prim = random.choices(
+            population=reactions["users"],
+            weights=[0.1 if weight < 0 else weight for weight in user_weights])[0]
+        mention = ', **please mention your teammate**' \
+                  f' within {round(cfg.teammate_pick_timeout / 60)} minutes or the booking will be rerolled' if self.bracket == '3v3' else ''
+        pick_message = f"<@{self.booster.prim}> was picked for {self.author.display_name}'s " \
+                       f"``{self.bracket} {self.type} {self.buyer.rating}`` boost ({reactions['time']}){mention}"
+        await self.post_channel.send(pick_message)
+
+        if self.bracket == '3v3':
+            self.cache()
+            scheduler.schedule(self.instance, self.id, "reroll", time.time() + cfg.teammate_pick_timeout, key=str(self.booster.prim))
+        else:
+            self._finish_pick()
+        return True
+
+    async def pick_teammate(self, teammate: discord.User):
+        """Sets the teammate mentioned by the picked booster of a 3v3 booking"""
+        scheduler.cancel(self.id, "reroll")
+        self.booster.sec, self.booster.prim_cut, self.booster.sec_cut = teammate.id, self.booster.prim_cut // 2, self.booster.prim_cut // 2
+        await self.post_channel.send(embed=base_embed(f"<@{self.booster.sec}> has been picked as <@{self.booster.prim}>'s teammate"))
+        self._finish_pick()
+
+    async def reroll(self):
+        """Reposts a 3v3 booking whose picked booster did not mention a teammate in time"""
+        if self.status != 1:
+            return
+        await self._recache_message()
+        embed = self.post_message.embeds[0]
+        embed.title = f"Rerolled {self.bracket} Bookings"
+        self.post_message = await self.post_channel.send(embed=embed)
+        await self.post_message.add_reaction(cfg.take_emoji)
+        await self.post_message.add_reaction(cfg.schedule_emoji)
+        self.booster.prim = None
+        self.cache()
+        scheduler.schedule(self.instance, self.id, "pick_winner", time.time() + cfg.post_wait_time)
 
-            except asyncio.TimeoutError:
-                embed = self.post_message.embeds[0]
-                embed.title = f"Rerolled {self.bracket} Bookings"
-                self.post_message = await self.post_channel.send(embed=embed)
-                await self.post_message.add_reaction(cfg.take_emoji)
-                await self.post_message.add_reaction(cfg.schedule_emoji)
-                return await self.pick_winner()
+    @classmethod
+    def _reroll_key(cls, booking_id):
+        booking = cls.registry.get(booking_id)
+        return str(booking.booster.prim) if booking else None
 
-            self.booster.sec, self.booster.prim_cut, self.booster.sec_cut = winner_message.mentions[0].id, self.booster.prim_cut // 2, self.booster.prim_cut // 2
-            if self.type == "Gladiator":
-                post_channel = self.post_channel_glad
-            else:
-                post_channel = self.post_channel_3v3
-            await post_channel.send(embed=base_embed(f"<@{self.booster.sec}> has been picked as {winner_user.mention}'s teammate"))
+    @classmethod
+    def awaiting_teammate(cls, user_id):
+        """:class:`list` The 3v3 bookings waiting on the given user to mention their teammate"""
+        bookings = [cls.registry.get(booking_id) for booking_id in scheduler.pending("reroll", key=str(user_id))]
+        return [b for b in bookings if b and str(b.booster.prim) == str(user_id)]
 
-        self.post_message = self.post_message.id
+    def _finish_pick(self):
         if self.booster.prim_cut > 100000:
-            for key in user_weights.keys():
-                if key == self.booster.prim:
-                    user_weights[key] = round(user_weights[key] - (self.booster.prim_cut * cfg.bad_luck_protection_mofifier), 5)
-
-                else:
-                    user_weights[key] = round(user_weights[key] + (self.booster.prim_cut * cfg.bad_luck_protection_mofifier), 5)
-        weight_file[self.bracket] = user_weights
-        json.dump(weight_file, open(f'{icfg[self.instance].directory}/userweights.json', 'w'), indent=4)
+            iweights[self.instance].apply_pick(self.bracket, self.booster.prim, self.booster.prim_cut * cfg.bad_luck_protection_mofifier)
         self.status = 2
+        self.cache()
 
     def cache(self):
-        with open(icfg[self.instance].directory+"/bookings.json", "r") as f:
-            jsondata = json.load(f)
-        temp_author = self._author
-        if isinstance(self._author, discord.User):
-            self._author = self._author.id
-        jsondata[str(self.id)] = jsonpickle.encode(self)
-        json.dump(jsondata, open(icfg[self.instance].directory+"/bookings.json", "w"), indent=4)
-        self._author = temp_author
+        with metrics.booking_cache_duration.time(instance=self.instance):
+            istore[self.instance].put(str(self.id), self.to_dict())
+        if self.archive.remove(self.id):
+            # an archived booking that changes is live again, it is archived again once it is cold
+            self.registry.add(self)
+        self.registry.notify("updated", self)
+
+    def update_sheet(self):
+        """Queues the booking to be written to its instance's sheet, see :class:`utils.sheets.SheetSync`"""
+        self.sheets.mark(self)
+
+    def sheet_row(self):
+        """:class:`list` The booking's row on the sheet, in :data:`sheet_columns` order"""
+        # IDs are written as text, sheets would round discord IDs as numbers
+        return [
+            str(self.id), time.strftime("%Y-%m-%d %H:%M", time.gmtime(self.timestamp or 0)), self.instance,
+            str(self.authorid), self.bracket, self.type, f"{self.buyer.name}-{self.buyer.realm}", self.buyer.faction,
+            self.buyer.class_, self.buyer.spec, self.buyer.rating, self.price, str(self.booster.prim or ""),
+            str(self.booster.sec or ""), self.booster.prim_cut, self.booster.sec_cut, self.booster.ad_cut,
+            self.booster.mana_cut, statuses[self.status], self.notes
+        ]
+
+    def to_dict(self):
+        """:class:`dict` The booking in the current storage schema, see :mod:`utils.codec`"""
+        return {
+            "v": codec.schema_version,
+            "id": self.id,
+            "instance": self.instance,
+            "author": self.authorid,
+            "bracket": self.bracket,
+            "status": int(self.status),
+            "type": self.type,
+            "buyer": self.buyer.to_dict(),
+            "price_recommendation": self.price_recommendation,
+            "ad_price_estimate": self.ad_price_estimate,
+            "price": self.price,
+            "booster": self.booster.to_dict(),
+            "notes": self.notes,
+            "post_message": getattr(self.post_message, "id", self.post_message),
+            "timestamp": self.timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, record):
+        """:class:`Booking` A booking from a stored record, the booking is not added to the registry"""
+        self = cls.__new__(cls)
+        self.instance = record["instance"]
+        self._author = record["author"]
+        self._bracket = sys.intern(record["bracket"])
+        self._status = Status(record["status"])
+        self.id = record["id"]
+        self.type = record["type"]
+        self.buyer = Buyer.from_dict(record["buyer"])
+        self.price_recommendation = record["price_recommendation"]
+        self.ad_price_estimate = record["ad_price_estimate"]
+        self.price = record["price"]
+        self.booster = Booster.from_dict(record["booster"])
+        self.notes = record["notes"]
+        self.post_message = record["post_message"]
+        self.timestamp = record["timestamp"]
+        return self
 
     def delete(self):
-        if self.status not in range(2):
-            jsondata = json.load(open(f"{icfg[self.instance].directory}/bookings.json", "r"))
-            if self.id not in jsondata.keys():
-                logger.warning("Tried to delete bookings not in cache")
-            else:
-                del jsondata[self.id]
-                with open(icfg[self.instance].directory+"/bookings.json", "w") as f:
-                    json.dump(jsondata, f, indent=4)
-        for i, obj in enumerate(self.instances[self.instance]):
-            if obj.id == self.id:
-                del self.instances[self.instance][i]
-        logger.info(f"Booking {self.id} has been deleted")
+        scheduler.cancel(self.id)
+        if not istore[self.instance].delete(self.id) and self.id not in self.archive and self.status != 0:
+            logger.warning("Tried to delete bookings not in cache", extra={"booking_id": self.id, "instance": self.instance})
+        self._unregister()
+        metrics.bookings_deleted.inc(instance=self.instance)
+        logger.info(f"Booking {self.id} has been deleted", extra={"booking_id": self.id, "instance": self.instance})
+
+    def _unregister(self):
+        if not self.registry.remove(self) and self.archive.remove(self.id):
+            self.registry.notify("removed", self)
 
     async def _get_boost_type(self):
         def boost_type_check(user_input):
@@ -408,10 +629,9 @@ class Booking(object):
         self.buyer.name = buyer_name.lower()
         self.buyer.realm = buyer_realm.lower()
         if cfg.auto_faction_class_input:
-            response = await request.get(
-                f'https://eu.api.blizzard.com/profile/wow/character/{self.buyer.realm.replace(" ", "-")}/{self.buyer.name}?namespace=profile-eu&locale=en_GB', token=True)
+            response = await profiles.lookup(self.buyer.realm, self.buyer.name)
             if response['status'] == 200:
-                self.buyer.faction, self.buyer.class_ = response['body']['faction']['name'], response['body']['character_class']['name'].capitalize()
+                self.buyer.faction, self.buyer.class_ = response['faction'], response['class_']
                 self.buyer.name = buyer_name
                 self.buyer.realm = buyer_realm
 
@@ -531,7 +751,7 @@ class Booking(object):
 
     async def _recache_message(self):
         if self.status == 1:
-            self.post_message = await self.post_channel.fetch_message(self.post_message.id)
+            self.post_message = await self.post_channel.fetch_message(getattr(self.post_message, "id", self.post_message))
 
     async def _status_update(self):
         await self.author.send(embed=base_embed(f"Booking ``{self.id}`` has been set to ``{statuses[self.status]}``"))
@@ -542,6 +762,8 @@ class Booking(object):
 
 
 class Buyer(object):
+    __slots__ = ("name", "realm", "faction", "class_", "spec", "rating")
+
     def __init__(self):
         self.name = None
         self.realm = None
@@ -553,10 +775,22 @@ class Buyer(object):
     def __repr__(self):
         return f"Name={self.name}-{self.realm} Faction={self.faction} Spec={self.spec} {self.class_} Rating={self.rating}"
 
+    def to_dict(self):
+        return {"name": self.name, "realm": self.realm, "faction": self.faction,
+                "class_": self.class_, "spec": self.spec, "rating": self.rating}
+
+    @classmethod
+    def from_dict(cls, record):
+        self = cls()
+        for field in ("name", "realm", "faction", "class_", "spec", "rating"):
+            setattr(self, field, record.get(field))
+        return self
+
 
 class Booster(object):
-    def __init__(self, instname):
-        self.instname = instname
+    __slots__ = ("prim", "sec", "prim_cut", "sec_cut", "ad_cut", "mana_cut")
+
+    def __init__(self):
         self.prim = None
         self.sec = None
         self.prim_cut = 0
@@ -564,11 +798,51 @@ class Booster(object):
         self.ad_cut = 0
         self.mana_cut = 0
 
-    def update_price(self, new_price: int):
+    def update_price(self, new_price: int, instname):
         if not self.sec:
-            self.prim_cut = new_price // icfg[self.instname].booster_cut
+            self.prim_cut = new_price // icfg[instname].booster_cut
         else:
-            self.prim_cut = new_price // (icfg[self.instname].booster_cut / 2)
-            self.sec_cut = new_price // (icfg[self.instname].booster_cut / 2)
-        self.ad_cut = new_price // icfg[self.instname].advertiser_cut
-        self.mana_cut = new_price // icfg[self.instname].management_cut
+            self.prim_cut = new_price // (icfg[instname].booster_cut / 2)
+            self.sec_cut = new_price // (icfg[instname].booster_cut / 2)
+        self.ad_cut = new_price // icfg[instname].advertiser_cut
+        self.mana_cut = new_price // icfg[instname].management_cut
+
+    def to_dict(self):
+        return {"prim": self.prim, "sec": self.sec, "prim_cut": self.prim_cut,
+                "sec_cut": self.sec_cut, "ad_cut": self.ad_cut, "mana_cut": self.mana_cut}
+
+    @classmethod
+    def from_dict(cls, record):
+        self = cls()
+        self.prim, self.sec = record.get("prim"), record.get("sec")
+        for field in ("prim_cut", "sec_cut", "ad_cut", "mana_cut"):
+            setattr(self, field, record.get(field, 0))
+        return self
+
+
+def scheduled_action(method):
+    """Wraps a booking method so the scheduler can run it from a booking ID"""
+    async def handler(booking_id):
+        booking = Booking.registry.get(booking_id)
+        if booking is None:
+            logger.warning(f"Discarding scheduled {method.__name__} for missing booking {booking_id}", extra={"booking_id": booking_id})
+            return
+        await method(booking)
+    return handler
+
+
+@metrics.collector
+def collect_booking_metrics():
+    metrics.bookings.clear()
+    for instname, bookings in Booking.registry.by_instance.items():
+        counts = defaultdict(int)
+        for b in bookings.values():
+            counts[statuses[b.status]] += 1
+        for status, count in Booking.archive.count("status", instname).items():
+            counts[statuses[status]] += count
+        for status, count in counts.items():
+            metrics.bookings.set(count, instance=instname, status=status)
+
+
+scheduler.register("pick_winner", scheduled_action(Booking.pick_winner))
+scheduler.register("reroll", scheduled_action(Booking.reroll))
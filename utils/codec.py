@@ -0,0 +1,63 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+schema_version = 1
+legacy_ignored_fields = ("cfg", "instname")
+
+
+def dumps(records, binary=False):
+    """:class:`bytes` The encoded records, as msgpack if binary is set (and msgpack is installed) otherwise as JSON"""
+    if binary and msgpack is not None:
+        return msgpack.packb(records, use_bin_type=True)
+    return json.dumps(records, separators=(",", ":")).encode("utf-8")
+
+
+def loads(encoded, binary=False):
+    if binary:
+        if msgpack is None:
+            raise RuntimeError("msgpack must be installed to read a binary booking store")
+        return msgpack.unpackb(encoded, raw=False, strict_map_key=False)
+    return json.loads(encoded)
+
+
+def upgrade(record):
+    """:class:`dict` A stored booking record in the current schema
+
+    Records written before the schema existed are jsonpickle strings (or their decoded dicts),
+    they are converted field by field without jsonpickle, dropping the ``py/`` tags and the
+    config manager and instance name old boosters carried around.
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    if record.get("v") == schema_version:
+        return record
+    if "v" in record:
+        raise ValueError(f"Unsupported booking schema version {record['v']}")
+
+    def strip(obj, ignored=()):
+        return {k: v for k, v in (obj or {}).items() if not k.startswith("py/") and k not in ignored}
+
+    post_message = record.get("post_message")
+    if isinstance(post_message, dict):
+        post_message = post_message.get("id")
+    return {
+        "v": schema_version,
+        "id": record["id"],
+        "instance": record["instance"],
+        "author": record.get("_author"),
+        "bracket": record.get("_bracket", record.get("bracket")),
+        "status": record.get("_status", record.get("status")),
+        "type": record.get("type"),
+        "buyer": strip(record.get("buyer")),
+        "price_recommendation": record.get("price_recommendation"),
+        "ad_price_estimate": record.get("ad_price_estimate"),
+        "price": record.get("price", 0),
+        "booster": strip(record.get("booster"), legacy_ignored_fields),
+        "notes": record.get("notes"),
+        "post_message": post_message,
+        "timestamp": record.get("timestamp")
+    }
@@ -1,4 +1,5 @@
 from utils.misc import get_logger
+import asyncio
 import json
 import os
 from socket import gethostname
@@ -23,17 +24,35 @@ def load_attrs(obj, path):
 
 
 class ConfigManager(object):
+    """Settings loaded from a JSON file, exposed as attributes
+
+    Changes made through :meth:`set` and :meth:`update` are only marked dirty, they are written
+    together once per event loop tick (or straight away when no loop is running) by replacing the
+    file with a fully written temporary file. :meth:`reload_if_changed` picks up edits made to the file.
+
+    Attributes
+    -----------
+    on_reload: :class:`list`
+        Callables run without arguments after the file has been reloaded.
+    """
     def __init__(self, directory, subdir):
         self.directory = directory
         self.subdir = subdir
         load_attrs(self, self.directory+self.subdir)
+        self._dirty = set()
+        self._flush_handle = None
+        self._mtime = self._stat()
+        self.on_reload = []
+
+    @property
+    def path(self):
+        return self.directory+self.subdir
 
     def set(self, key, value):
         if key in self.__dict__.keys():
             setattr(self, key, value)
-            file = json.load(open(self.directory+self.subdir, "r"))
-            file[key] = value
-            json.dump(file, open(self.directory+self.subdir, "w"), indent=4)
+            self._dirty.add(key)
+            self._schedule_flush()
             return True
 
         else:
@@ -41,7 +60,73 @@ class ConfigManager(object):
             return False
 
     def update(self):
-        json.dump(self.__dict__, open(self.directory+self.subdir, "w"), indent=4)
+        """Marks every setting as changed, for settings that were modified in place"""
+        self._dirty.update(self.settings().keys())
+        self._schedule_flush()
+
+    def settings(self):
+        """:class:`dict` Every setting, leaving out the manager's own state"""
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_") and k != "on_reload"}
+
+    def flush(self):
+        """Writes the dirty settings into the file, settings that haven't changed are kept as they are on disk"""
+        self._flush_handle = None
+        if not self._dirty:
+            return
+        try:
+            with open(self.path, "r") as f:
+                file = json.load(f)
+        except (OSError, ValueError):
+            file = {}
+        settings = self.settings()
+        file.update({key: settings[key] for key in self._dirty if key in settings})
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(file, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._dirty.clear()
+        self._mtime = self._stat()
+
+    def reload_if_changed(self):
+        """:class:`bool` Reloads the file if it was changed by something other than this manager"""
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+        try:
+            with open(self.path, "r") as f:
+                file = json.load(f)
+        except ValueError:
+            # the file may be caught mid-edit, it is read again on the next change
+            logger.error(f"Invalid syntax in {self.path}, keeping the current settings")
+            return False
+        self._mtime = mtime
+        for k, v in file.items():
+            if k not in self._dirty:
+                setattr(self, k, v)
+        for callback in self.on_reload:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Failed to apply reloaded {self.path}: {e!r}")
+        logger.info(f"Reloaded {self.path}")
+        return True
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_soon(self.flush)
 
 
 class GenDataManager(object):
@@ -74,3 +159,18 @@ else:
     logger.info("! Running on developer mode !")
     icfg["developer"] = ConfigManager('data/developer', "/config.json")
     ipricing["developer"] = ConfigManager('data/developer', "/pricing.json")
+
+
+def config_managers():
+    """:class:`list` Every loaded config manager"""
+    return [cfg, *icfg.values(), *ipricing.values()]
+
+
+def flush_configs():
+    for manager in config_managers():
+        manager.flush()
+
+
+def reload_configs():
+    """:class:`list` Reloads every config file changed on disk, returns the managers that were reloaded"""
+    return [manager for manager in config_managers() if manager.reload_if_changed()]
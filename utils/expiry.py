@@ -0,0 +1,49 @@
+import heapq
+import time
+
+
+class ExpiryIndex(object):
+    """Min-heap of booking expiry times, kept up to date from the registry's change events
+
+    Archived bookings keep their entry, entries of removed bookings are dropped lazily
+    when they reach the top of the heap.
+
+    Attributes
+    -----------
+    heap: :class:`list`
+        The [expires at, booking ID, instname] entries, stale entries are left in place.
+    entries: :class:`dict`
+        The live heap entry of each booking ID.
+    ttl: Callable[[:class:`str`], :class:`float`]
+        Returns the number of seconds the bookings of an instance are kept for.
+    """
+    def __init__(self, registry, ttl):
+        self.heap = []
+        self.entries = {}
+        self.ttl = ttl
+        registry.subscribe(self.on_change)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def on_change(self, event, booking, **details):
+        if event == "added":
+            self.push(booking.instance, booking.id, (booking.timestamp or 0) + self.ttl(booking.instance))
+        elif event == "removed":
+            self.entries.pop(booking.id, None)
+
+    def push(self, instname, booking_id, expires_at):
+        entry = [expires_at, booking_id, instname]
+        self.entries[booking_id] = entry
+        heapq.heappush(self.heap, entry)
+
+    def due(self, now=None):
+        """:class:`list` Pops the (instname, booking ID) of every booking that has expired"""
+        now = time.time() if now is None else now
+        expired = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self.entries.get(entry[1]) is entry:
+                del self.entries[entry[1]]
+                expired.append((entry[2], entry[1]))
+        return expired
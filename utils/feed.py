@@ -0,0 +1,90 @@
+from collections import deque
+from contextlib import contextmanager
+import asyncio
+import json
+import time
+import uuid
+
+event_types = {
+    "added": "created",
+    "removed": "deleted",
+    "status": "status",
+    "updated": "updated",
+    "taken": "taken",
+    "transferred": "transferred"
+}
+
+
+class ChangeFeed(object):
+    """Sequenced change events of every registered booking, for consumers of the /events stream
+
+    Events are numbered from 1 for the lifetime of the process, the ``epoch`` token changes on every
+    restart so consumers resuming from an event ID of a previous process know to re-fetch everything.
+
+    Attributes
+    -----------
+    events: :class:`collections.deque`
+        The most recent (sequence number, encoded event) pairs, used to replay missed events.
+    subscribers: :class:`set`
+        The queues of the connected consumers.
+    """
+    def __init__(self, registry, history=1000, queue_size=1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.events = deque(maxlen=history)
+        self.subscribers = set()
+        self.queue_size = queue_size
+        self._muted = False
+        registry.subscribe(self.on_change)
+
+    @contextmanager
+    def muted(self):
+        """Drops the events of registry changes made inside the block, such as bookings being loaded at startup"""
+        self._muted = True
+        try:
+            yield
+        finally:
+            self._muted = False
+
+    def on_change(self, event, booking, **details):
+        if event in event_types and not self._muted:
+            self.publish(event_types[event], booking, **details)
+
+    def publish(self, event_type, booking, **details):
+        self.seq += 1
+        event = {
+            "seq": self.seq,
+            "type": event_type,
+            "id": booking.id,
+            "instance": booking.instance,
+            "bracket": booking.bracket,
+            "status": booking.status,
+            "time": time.time(),
+            **details
+        }
+        encoded = json.dumps(event, default=str)
+        self.events.append((self.seq, encoded))
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((self.seq, encoded))
+            except asyncio.QueueFull:
+                # slow consumers are dropped rather than buffered without limit, they can resume from their last event
+                self.subscribers.discard(queue)
+
+    def since(self, event_id):
+        """:class:Optional[`list`] The events after the given event ID, None if they can no longer be replayed"""
+        epoch, _, seq = (event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isnumeric():
+            return None
+        seq = int(seq)
+        if seq > self.seq or (self.events and seq < self.events[0][0] - 1) or (not self.events and seq != self.seq):
+            return None
+        return [(n, encoded) for n, encoded in self.events if n > seq]
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
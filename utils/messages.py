@@ -0,0 +1,35 @@
+class MessageCache(object):
+    """Handles of the bot's long-lived messages (request messages and untaken board pages),
+    so they can be reacted to and edited without fetching them first
+
+    Attributes
+    -----------
+    messages: :class:`dict`
+        The cached :class:`discord.Message` objects, keyed by message ID.
+    """
+    def __init__(self):
+        self.messages = {}
+
+    def __contains__(self, message_id):
+        return message_id in self.messages
+
+    def put(self, message):
+        self.messages[message.id] = message
+        return message
+
+    def get(self, message_id):
+        return self.messages.get(message_id)
+
+    def invalidate(self, message_id):
+        """:class:`bool` Forgets a message that has been deleted, returns whether it was cached"""
+        return self.messages.pop(message_id, None) is not None
+
+    async def fetch(self, channel, message_id):
+        """:class:`discord.Message` The cached message, only fetched from discord if it isn't cached"""
+        message = self.messages.get(message_id)
+        if message is None:
+            message = self.put(await channel.fetch_message(message_id))
+        return message
+
+
+message_cache = MessageCache()
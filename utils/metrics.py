@@ -0,0 +1,148 @@
+import math
+import time
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+registry = []
+collectors = []
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """Base of the metric types, a value is kept per combination of label values
+
+    Attributes
+    -----------
+    name: :class:`str`
+        The name the metric is exposed under.
+    labelnames: :class:`tuple`
+        The names of the labels every observation must be given.
+    values: :class:`dict`
+        The value of each combination of label values, keyed by a tuple of the values in ``labelnames`` order.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, **extra):
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, self._labels(key), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {format_value(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def clear(self):
+        self.values.clear()
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets, for timings use :meth:`time`"""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=default_buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts = self.values.get(key)
+        if counts is None:
+            counts = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[0][i] += 1
+                break
+        counts[1] += value
+        counts[2] += 1
+
+    def time(self, **labels):
+        """A context manager observing the seconds spent inside it"""
+        return Timer(self, labels)
+
+    def samples(self):
+        for key, (buckets, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                yield self.name + "_bucket", self._labels(key, le=format_value(bound)), cumulative
+            yield self.name + "_sum", self._labels(key), total
+            yield self.name + "_count", self._labels(key), count
+
+
+class Timer(object):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def collector(function):
+    """Registers a function run before every scrape, used to set gauges from current state"""
+    collectors.append(function)
+    return function
+
+
+def render():
+    """:class:`str` Every metric in the prometheus text exposition format"""
+    for function in collectors:
+        function()
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+http_requests = Counter("pvpsignups_http_requests_total", "Outgoing HTTP requests", ["host", "status"])
+http_request_duration = Histogram("pvpsignups_http_request_duration_seconds", "Duration of outgoing HTTP requests", ["host"])
+token_requests = Counter("pvpsignups_token_requests_total", "Access token lookups by whether they were served from the cache", ["field", "result"])
+token_request_duration = Histogram("pvpsignups_token_request_duration_seconds", "Duration of access token requests", ["field"])
+booking_cache_duration = Histogram("pvpsignups_booking_cache_duration_seconds", "Duration of writing a booking to the store", ["instance"], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+bookings_deleted = Counter("pvpsignups_bookings_deleted_total", "Deleted bookings", ["instance"])
+compile_step_duration = Histogram("pvpsignups_compile_step_duration_seconds", "Duration of each step of compiling a booking, including the time taken to answer", ["instance", "step"])
+pick_winner_duration = Histogram("pvpsignups_pick_winner_duration_seconds", "Duration of picking the booster of a booking", ["instance", "bracket"])
+picks = Counter("pvpsignups_picks_total", "Winner picks by outcome", ["instance", "bracket", "outcome"])
+board_refresh_duration = Histogram("pvpsignups_untaken_board_refresh_duration_seconds", "Duration of untaken board refreshes", ["instance", "bracket"])
+board_pages = Counter("pvpsignups_untaken_board_pages_total", "Untaken board pages handled by refreshes, by what was done to them", ["instance", "bracket", "result"])
+bookings = Gauge("pvpsignups_bookings", "Bookings held in memory", ["instance", "status"])
@@ -1,5 +1,18 @@
 import discord
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import json
 import logging
+import queue
+
+log_format = '%(asctime)s: %(name)s %(levelname)s: %(message)s'
+log_queue = queue.SimpleQueue()
+log_listener = None
+current_booking = contextvars.ContextVar("current_booking", default=None)
+task_bookings = {}
 
 
 def base_embed(description, title=''):
@@ -10,18 +23,83 @@ def base_embed(description, title=''):
     )
 
 
+class JsonFormatter(logging.Formatter):
+    """Formats records as single line JSON objects, the booking ID and instance
+    of a record are included when passed through ``extra``"""
+    fields = ("booking_id", "instance")
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        for field in self.fields:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(filename='discord.log', max_bytes=5242880, backup_count=5, json_format=False):
+    """(Re)starts the background listener that writes queued records to the console and a rotating log file,
+    loggers only put records on a queue so a slow disk never blocks the event loop"""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+    file_handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(log_format))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(log_format))
+    log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    log_listener.start()
+
+
+def stop_logging():
+    """Writes out every queued record and stops the listener"""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
 def get_logger(name):
     _logger = logging.getLogger(name)
     if not _logger.handlers:
-        formatter = logging.Formatter('%(asctime)s: %(name)s %(levelname)s: %(message)s')
+        if log_listener is None:
+            configure_logging()
         _logger.setLevel(logging.INFO)
-
-        file_handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
-        file_handler.setFormatter(formatter)
-        _logger.addHandler(file_handler)
-
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        _logger.addHandler(console_handler)
+        _logger.addHandler(QueueHandler(log_queue))
         _logger.propagate = False
     return _logger
+
+
+@contextlib.contextmanager
+def handling_booking(booking_id, instname=None):
+    """Tags the running task with the booking it handles, as a ``(booking_id, instance)`` tuple in
+    :data:`current_booking` and in :data:`task_bookings`, which other threads can read by task"""
+    tag = (booking_id, instname)
+    token = current_booking.set(tag)
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        task_bookings[task] = tag
+    try:
+        yield tag
+    finally:
+        current_booking.reset(token)
+        if task is not None:
+            if current_booking.get() is None:
+                task_bookings.pop(task, None)
+            else:
+                task_bookings[task] = current_booking.get()
+
+
+def task_booking(loop):
+    """:class:Optional[`tuple`] The booking tag of the task a loop is running, safe to call from any thread"""
+    return task_bookings.get(asyncio.current_task(loop))
+
+
+atexit.register(stop_logging)
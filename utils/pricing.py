@@ -1,33 +1,91 @@
 from bisect import bisect
+import functools
 from utils.config import ipricing
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-def set_rating(instname, bracket, current_rating, end_rating):
-    price = 0
-    _pricing = ipricing[instname].set_rating[bracket]
-    brackets = ipricing[instname].brackets
-    end_rating_bracket = bisect(brackets, end_rating)
 
-    while bisect(brackets, current_rating) < end_rating_bracket:
-        rating_to_next_bracket = brackets[bisect(brackets, current_rating)] - current_rating
-        current_bracket_price = _pricing[bisect(brackets, current_rating) - 1]
-        price += rating_to_next_bracket * current_bracket_price
-        current_rating = brackets[bisect(brackets, current_rating)]
+class PriceTable(object):
+    """The set rating prices of one bracket compiled into a cumulative table
 
-    if bisect(brackets, current_rating) == bisect(brackets, end_rating):
-        current_bracket_price = _pricing[bisect(brackets, current_rating) - 1]
-        price += (end_rating - current_rating) * current_bracket_price
+    Attributes
+    -----------
+    brackets: :class:`list`
+        The ratings each price bracket starts at.
+    rates: :class:`list`
+        The price per rating point in each price bracket.
+    cumulative: :class:`list`
+        The price of going from the first bracket to the start of each bracket.
+    """
+    def __init__(self, brackets, rates):
+        self.brackets = brackets
+        self.rates = rates
+        self.cumulative = [0]
+        for i, rate in enumerate(rates[:len(brackets) - 1]):
+            self.cumulative.append(self.cumulative[-1] + (brackets[i + 1] - brackets[i]) * rate)
+        self.last = min(len(rates), len(brackets)) - 1
+        if numpy is not None:
+            self._brackets = numpy.array(brackets[:self.last + 1])
+            self._rates = numpy.array(rates[:self.last + 1])
+            self._cumulative = numpy.array(self.cumulative[:self.last + 1])
 
-    return price
+    def cost(self, rating):
+        """The price of going from the first bracket to the given rating"""
+        i = min(bisect(self.brackets, rating) - 1, self.last)
+        return self.cumulative[i] + (rating - self.brackets[i]) * self.rates[i]
 
+    def costs(self, ratings):
+        """The price of going from the first bracket to each of the given ratings"""
+        if numpy is None:
+            return [self.cost(rating) for rating in ratings]
+        ratings = numpy.asarray(ratings)
+        i = numpy.minimum(numpy.searchsorted(self._brackets, ratings, side="right") - 1, self.last)
+        return self._cumulative[i] + (ratings - self._brackets[i]) * self._rates[i]
+
+
+tables = {}
+
+
+def compile_pricing(instname):
+    """Builds the price tables of an instance from its pricing.json, must be called again whenever it is reloaded"""
+    instpricing = ipricing[instname]
+    tables[instname] = {
+        "set_rating": {bracket: PriceTable(instpricing.brackets, rates) for bracket, rates in instpricing.set_rating.items()},
+        "one_win": {bracket: (instpricing.one_win_brackets, prices) for bracket, prices in instpricing.one_win.items()}
+    }
+
+
+def set_rating(instname, bracket, current_rating, end_rating):
+    table = tables[instname]["set_rating"][bracket]
+    return table.cost(end_rating) - table.cost(current_rating)
 
-def one_win(instname, bracket, current_rating):
-    pricing = ipricing[instname].one_win[bracket]
-    if current_rating > ipricing[instname].one_win_brackets[-1]:
-        current_rating = ipricing[instname].one_win_brackets[-1]
 
-    return pricing[bisect(ipricing[instname].one_win_brackets, current_rating) - 1]
+def set_rating_many(instname, quotes):
+    """:class:`list` The set rating price of each (bracket, current rating, end rating) quote, in order"""
+    prices = [0] * len(quotes)
+    by_bracket = {}
+    for n, (bracket, current_rating, end_rating) in enumerate(quotes):
+        by_bracket.setdefault(bracket, []).append((n, current_rating, end_rating))
+    for bracket, bracket_quotes in by_bracket.items():
+        table = tables[instname]["set_rating"][bracket]
+        positions, current_ratings, end_ratings = zip(*bracket_quotes)
+        for n, start_cost, end_cost in zip(positions, table.costs(current_ratings), table.costs(end_ratings)):
+            prices[n] = int(end_cost - start_cost)
+    return prices
+
+
+def one_win(instname, bracket, current_rating):
+    one_win_brackets, pricing = tables[instname]["one_win"][bracket]
+    return pricing[min(bisect(one_win_brackets, current_rating), len(pricing)) - 1]
 
 
 def hourly(instname, bracket):
     return ipricing[instname].hourly[bracket]
+
+
+for _instname in ipricing.keys():
+    compile_pricing(_instname)
+    ipricing[_instname].on_reload.append(functools.partial(compile_pricing, _instname))
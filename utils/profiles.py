@@ -0,0 +1,120 @@
+from utils.misc import get_logger
+from utils.request import request
+from utils.config import cfg
+
+from collections import OrderedDict
+from time import time
+import json
+import os
+
+logger = get_logger("PvpSignups")
+
+
+class ProfileCache(object):
+    """Bounded LRU cache of blizzard character profiles keyed by (realm, name)
+
+    Entries younger than ``ttl`` are returned without a request, older entries are revalidated
+    with an If-Modified-Since request (a 304 response refreshes them without a new body)
+    and entries older than ``max_age`` are evicted.
+
+    Attributes
+    -----------
+    entries: :class:`collections.OrderedDict`
+        The cached profiles in least to most recently used order, each value is a dict
+        containing the 'faction', 'class_', 'last_modified' and 'fetched_at' of the character.
+    path: :class:Optional[`str`]
+        The file the cache is persisted to, persistence is disabled if None.
+    api_url: :class:`str`
+        The base URL of the blizzard profile API.
+    """
+    def __init__(self, path=None, max_size=5000, ttl=86400, max_age=604800, api_url="https://eu.api.blizzard.com"):
+        self.entries = OrderedDict()
+        self.path = path
+        self.api_url = api_url.rstrip("/")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_age = max_age
+        self.dirty = False
+
+    def load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except json.decoder.JSONDecodeError:
+            logger.warning(f"Discarding unreadable profile cache at {self.path}")
+            return
+        now = time()
+        for key, entry in entries:
+            if now - entry["fetched_at"] < self.max_age:
+                self.entries[tuple(key)] = entry
+        self._evict()
+        logger.info(f"Loaded {len(self.entries)} cached character profile(s)")
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump([[list(key), entry] for key, entry in self.entries.items()], f)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    async def lookup(self, realm, name):
+        """:class:`dict` Gets the faction and class of a character
+
+        The returned dict always contains the 'status' of the lookup, 200 responses (cached or not)
+        also contain the 'faction' and 'class_' of the character.
+        """
+        key = (realm.lower(), name.lower())
+        entry = self.entries.get(key)
+        now = time()
+        if entry and now - entry["fetched_at"] >= self.max_age:
+            del self.entries[key]
+            entry = None
+        if entry and now - entry["fetched_at"] < self.ttl:
+            self.entries.move_to_end(key)
+            return {'status': 200, **entry}
+
+        cache = {'status': 304, 'last_modified': entry['last_modified']} if entry and entry['last_modified'] else None
+        response = await request.get(
+            f'{self.api_url}/profile/wow/character/{key[0].replace(" ", "-")}/{key[1]}'
+            '?namespace=profile-eu&locale=en_GB', cache=cache, token=True)
+
+        if response['status'] == 304:
+            entry['fetched_at'] = now
+        elif response['status'] == 200:
+            entry = {
+                'faction': response['body']['faction']['name'],
+                'class_': response['body']['character_class']['name'].capitalize(),
+                'last_modified': response['last_modified'],
+                'fetched_at': now
+            }
+        elif response['status'] == 404:
+            if self.entries.pop(key, None):
+                self.dirty = True
+            return response
+        elif entry:
+            logger.warning(f"Profile lookup for {name}-{realm} failed with status {response['status']}, using cached profile")
+            return {'status': 200, **entry}
+        else:
+            return response
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.dirty = True
+        self._evict()
+        return {'status': 200, **entry}
+
+    def _evict(self):
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+profiles = ProfileCache(
+    path=getattr(cfg, "profile_cache_path", "data/profiles.json"),
+    max_size=getattr(cfg, "profile_cache_size", 5000),
+    ttl=getattr(cfg, "profile_cache_ttl", 86400),
+    max_age=getattr(cfg, "profile_cache_max_age", 604800),
+    api_url=getattr(cfg, "wowapi_api_url", "https://eu.api.blizzard.com"))
@@ -0,0 +1,120 @@
+from collections import defaultdict
+from bisect import bisect_left, insort
+
+
+class BookingRegistry(object):
+    """In-memory index of every loaded booking
+
+    Attributes
+    -----------
+    by_id: :class:`dict`
+        Every registered booking keyed by booking ID.
+    by_instance: :class:`dict`
+        Bookings grouped by instance name, each group is a dict keyed by booking ID.
+    by_status: :class:`dict`
+        Bookings grouped by status, each group is a dict keyed by booking ID.
+    by_bracket: :class:`dict`
+        Bookings grouped by bracket, each group is a dict keyed by booking ID.
+    sorted_groups: :class:`dict`
+        Bookings grouped by (instance, bracket, status), each group is a list of
+        (sort key, booking ID) kept sorted by the buyers class and spec.
+    listeners: :class:`list`
+        Callables notified of every change as ``listener(event, booking, **details)``, the events are
+        'added', 'removed', 'archived' (removed into the archive), 'status', 'bracket'
+        and 'updated' (sent by :meth:`notify` when a booking is cached).
+    """
+    def __init__(self, instnames):
+        self.by_id = {}
+        self.by_instance = {instname: {} for instname in instnames}
+        self.by_status = defaultdict(dict)
+        self.by_bracket = defaultdict(dict)
+        self.sorted_groups = defaultdict(list)
+        self._sorted_entries = {}
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(list(self.by_id.values()))
+
+    def __contains__(self, booking):
+        return self.by_id.get(booking.id) is booking
+
+    def add(self, booking):
+        self.by_id[booking.id] = booking
+        self.by_instance.setdefault(booking.instance, {})[booking.id] = booking
+        self.by_status[booking.status][booking.id] = booking
+        self.by_bracket[booking.bracket][booking.id] = booking
+        self._insert_sorted(booking)
+        self.notify("added", booking)
+
+    def remove(self, booking, event="removed"):
+        if self.by_id.get(booking.id) is not booking:
+            return False
+        del self.by_id[booking.id]
+        self.by_instance[booking.instance].pop(booking.id, None)
+        self.by_status[booking.status].pop(booking.id, None)
+        self.by_bracket[booking.bracket].pop(booking.id, None)
+        self._remove_sorted(booking)
+        self.notify(event, booking)
+        return True
+
+    def get(self, booking_id):
+        return self.by_id.get(booking_id)
+
+    def reindex(self, booking, field, old, new):
+        """Moves a registered booking between groups after its status or bracket has changed"""
+        index = self.by_status if field == "status" else self.by_bracket
+        index[old].pop(booking.id, None)
+        index[new][booking.id] = booking
+        self._remove_sorted(booking)
+        self._insert_sorted(booking)
+        self.notify(field, booking, old=old, new=new)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, event, booking, **details):
+        for listener in self.listeners:
+            listener(event, booking, **details)
+
+    def instance(self, instname):
+        """:class:`list` Every booking belonging to the given instance"""
+        return list(self.by_instance.get(instname, {}).values())
+
+    def filter(self, instance=None, status=None, bracket=None):
+        """:class:`list` Bookings matching every given criteria, only the smallest matching group is iterated"""
+        groups = []
+        if instance is not None:
+            groups.append(self.by_instance.get(instance, {}))
+        if status is not None:
+            groups.append(self.by_status.get(status, {}))
+        if bracket is not None:
+            groups.append(self.by_bracket.get(bracket, {}))
+        if not groups:
+            return list(self.by_id.values())
+        groups.sort(key=len)
+        smallest, rest = groups[0], groups[1:]
+        return [b for booking_id, b in smallest.items() if all(booking_id in group for group in rest)]
+
+    def sorted(self, instance, bracket, status):
+        """:class:`list` Bookings in the given group, ordered by the buyers class and spec"""
+        return [self.by_id[booking_id] for _, booking_id in self.sorted_groups.get((instance, bracket, status), [])]
+
+    def _insert_sorted(self, booking):
+        group_key = (booking.instance, booking.bracket, booking.status)
+        entry = ((booking.buyer.class_ or "", booking.buyer.spec or "", booking.timestamp or 0), booking.id)
+        insort(self.sorted_groups[group_key], entry)
+        self._sorted_entries[booking.id] = (group_key, entry)
+
+    def _remove_sorted(self, booking):
+        group_key, entry = self._sorted_entries.pop(booking.id, (None, None))
+        if group_key is None:
+            return
+        group = self.sorted_groups[group_key]
+        i = bisect_left(group, entry)
+        if i < len(group) and group[i] == entry:
+            del group[i]
+        if not group:
+            del self.sorted_groups[group_key]
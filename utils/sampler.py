@@ -0,0 +1,184 @@
+from utils.misc import get_logger, task_booking
+from utils.config import cfg
+
+from collections import Counter
+import threading
+import asyncio
+import time
+import sys
+import os
+
+logger = get_logger('PvpSignups')
+
+
+def frame_label(frame):
+    """:class:`str` A function name and where it is defined, paths are kept relative to the bot's directory"""
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    else:
+        filename = os.path.join(*filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """:class:`str` The stack of a frame in flamegraph collapsed format, outermost call first"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def format_stack(frame):
+    """:class:`str` A traceback style listing of a stack, built from code objects and line numbers only
+    so that it's safe to call on the frames of a running thread"""
+    lines = []
+    while frame is not None:
+        code = frame.f_code
+        lines.append(f'  File "{code.co_filename}", line {frame.f_lineno}, in {code.co_name}\n')
+        frame = frame.f_back
+    return "".join(reversed(lines))
+
+
+class SamplingProfiler(object):
+    """Periodically records the stack of a thread from a background thread, adds no overhead to the sampled code
+
+    Attributes
+    -----------
+    interval: :class:`float`
+        The number of seconds between samples.
+    stacks: :class:`collections.Counter`
+        How many times each collapsed stack was seen during the last run.
+    samples: :class:`int`
+        The number of samples taken during the last run.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, thread_id=None):
+        """Starts sampling for at most the given number of seconds
+
+        Parameters
+        -----------
+        seconds: :class:`float`
+            How long to sample for, :meth:`stop` ends the run early.
+        thread_id: :class:Optional[`int`]
+            The thread to sample, every other thread is sampled too if not given.
+        """
+        if self.running:
+            raise RuntimeError("The profiler is already running")
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(time.monotonic() + seconds, thread_id), name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, deadline, thread_id):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_id or (thread_id is not None and ident != thread_id):
+                    continue
+                stack = collapse(frame)
+                if thread_id is None:
+                    stack = f"{names.get(ident, ident)};{stack}"
+                self.stacks[stack] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """:class:`str` The recorded stacks in flamegraph collapsed format, one ``stack count`` line each"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class LoopWatchdog(object):
+    """Detects callbacks blocking the event loop, a coroutine on the loop beats every ``interval`` seconds
+    and a background thread logs the loop thread's stack whenever a beat is late by over ``threshold`` seconds
+
+    Attributes
+    -----------
+    threshold: :class:`float`
+        How long the loop can be blocked for before it is reported.
+    interval: :class:`float`
+        The number of seconds between beats and between checks.
+    last_beat: :class:`float`
+        The monotonic time of the latest beat.
+    """
+    def __init__(self, threshold=0.5, interval=0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.last_beat = time.monotonic()
+        self._loop = None
+        self._loop_thread = None
+        self._stop = threading.Event()
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, loop):
+        """Starts watching the loop, must be called from the thread running it"""
+        if self.running:
+            return
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = loop.create_task(self._beat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _beat(self):
+        while not self._stop.is_set():
+            self.last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        stalled_since = None
+        while not self._stop.wait(self.interval):
+            last_beat = self.last_beat
+            blocked = time.monotonic() - last_beat - self.interval
+            if blocked < self.threshold:
+                if stalled_since is not None:
+                    logger.warning(f"Event loop was blocked for {last_beat - stalled_since - self.interval:.3f}s")
+                    stalled_since = None
+                continue
+            if stalled_since is not None:
+                continue
+            stalled_since = last_beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            # the tag is set by the task itself, the locals of the blocked frames are never touched
+            booking_id, instname = task_booking(self._loop) or (None, None)
+            extra = {"booking_id": booking_id, "instance": instname} if booking_id is not None else {}
+            logger.warning(
+                f"Event loop blocked for over {blocked:.3f}s"
+                f"{f' while handling booking {booking_id}' if booking_id is not None else ''}, blocked at:\n"
+                + format_stack(frame), extra=extra)
+
+
+profiler = SamplingProfiler(getattr(cfg, "profiler_interval", 0.005))
+watchdog = LoopWatchdog(getattr(cfg, "watchdog_threshold", 0.5), getattr(cfg, "watchdog_interval", 0.1))
@@ -0,0 +1,177 @@
+from utils.misc import get_logger, handling_booking
+from utils.config import icfg
+
+from collections import defaultdict
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+
+logger = get_logger("PvpSignups")
+
+
+class DeadlineScheduler(object):
+    """Runs booking actions once their deadline has passed, from a single loop
+
+    Deadlines are kept in a min-heap and saved to ``deadlines.json`` in the instance directory
+    whenever they change, so pending winner picks and teammate timeouts resume after a restart.
+    Changes made during the same loop iteration are written together, once per instance.
+
+    Attributes
+    -----------
+    heap: :class:`list`
+        The pending deadlines as [due, sequence, instname, booking ID, action, key] entries,
+        cancelled entries stay in the heap with their action set to None until they are popped.
+    entries: :class:`dict`
+        The live heap entry for each (booking ID, action) pair.
+    keyed: :class:`dict`
+        The booking IDs of the live entries scheduled with a key, per (action, key) pair.
+    handlers: :class:`dict`
+        The coroutine function run for each action, called with the booking ID.
+    running: :class:`set`
+        The tasks of the actions currently running, referenced here so they can't be garbage collected mid-run.
+    """
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.keyed = defaultdict(set)
+        self.handlers = {}
+        self.running = set()
+        self._counter = itertools.count()
+        self._dirty = set()
+        self._save_handle = None
+        self._wakeup = None
+        self._task = None
+
+    def register(self, action, handler):
+        self.handlers[action] = handler
+
+    def schedule(self, instname, booking_id, action, due, save=True, key=None):
+        """Runs the action for the booking at the given timestamp, replacing any pending deadline for the same action,
+        deadlines scheduled with a key can be looked up by it through :meth:`pending`"""
+        self.cancel(booking_id, action, save=False)
+        entry = [due, next(self._counter), instname, booking_id, action, key]
+        heapq.heappush(self.heap, entry)
+        self.entries[(booking_id, action)] = entry
+        if key is not None:
+            self.keyed[(action, key)].add(booking_id)
+        if save:
+            self.save(instname)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, booking_id, action=None, save=True):
+        """Cancels the pending deadline of the given action, or every pending deadline of the booking if no action is given"""
+        actions = [action] if action else [a for a in self.handlers if (booking_id, a) in self.entries]
+        instnames = set()
+        for a in actions:
+            entry = self.entries.pop((booking_id, a), None)
+            if entry:
+                self._unindex(entry)
+                entry[4] = None
+                instnames.add(entry[2])
+        if save:
+            for instname in instnames:
+                self.save(instname)
+
+    def pending(self, action, key=None):
+        """:class:`list` The booking IDs with a pending deadline for the given action, only those scheduled with the key if one is given"""
+        if key is not None:
+            return list(self.keyed.get((action, key), ()))
+        return [b for (b, a) in self.entries.keys() if a == action]
+
+    def save(self, instname):
+        """Marks the deadlines of an instance to be written once the running callback returns,
+        or writes them right away if no loop is running"""
+        self._dirty.add(instname)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._save_handle is None:
+            self._save_handle = loop.call_soon(self.flush)
+
+    def flush(self):
+        """Writes the deadlines of every instance marked by :meth:`save`"""
+        self._save_handle = None
+        while self._dirty:
+            instname = self._dirty.pop()
+            path = f"{icfg[instname].directory}/deadlines.json"
+            deadlines = [[e[0], e[3], e[4], e[5]] for e in self.entries.values() if e[2] == instname]
+            with open(path + ".tmp", "w") as f:
+                json.dump(deadlines, f, indent=4)
+            os.replace(path + ".tmp", path)
+
+    def load(self, instname, keys=None):
+        """Resumes the saved deadlines of an instance
+
+        Parameters
+        -----------
+        keys: :class:Optional[`dict`]
+            A function returning the key of a booking ID for each keyed action, used for deadlines saved without one.
+        """
+        keys = keys or {}
+        path = f"{icfg[instname].directory}/deadlines.json"
+        if not os.path.isfile(path):
+            return
+        with open(path, "r") as f:
+            deadlines = json.load(f)
+        for due, booking_id, action, *key in deadlines:
+            # deadlines saved by older versions have no key
+            key = key[0] if key else None
+            if key is None and action in keys:
+                key = keys[action](booking_id)
+            self.schedule(instname, booking_id, action, due, save=False, key=key)
+        logger.info(f"Resumed {len(deadlines)} pending deadline(s) for {instname}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            while self.heap and self.heap[0][4] is None:
+                heapq.heappop(self.heap)
+            timeout = max(self.heap[0][0] - time.time(), 0) if self.heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            due_instances = set()
+            while self.heap and self.heap[0][0] <= time.time():
+                entry = heapq.heappop(self.heap)
+                due, _, instname, booking_id, action, key = entry
+                if action is None:
+                    continue
+                del self.entries[(booking_id, action)]
+                self._unindex(entry)
+                due_instances.add(instname)
+                task = asyncio.ensure_future(self._dispatch(instname, booking_id, action))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+            for instname in due_instances:
+                self.save(instname)
+
+    def _unindex(self, entry):
+        key = (entry[4], entry[5])
+        if entry[5] is not None and key in self.keyed:
+            self.keyed[key].discard(entry[3])
+            if not self.keyed[key]:
+                del self.keyed[key]
+
+    async def _dispatch(self, instname, booking_id, action):
+        try:
+            with handling_booking(booking_id, instname):
+                await self.handlers[action](booking_id)
+        except Exception as e:
+            logger.error(f"Scheduled {action} for booking {booking_id} failed: {e!r}", extra={"booking_id": booking_id})
+
+
+scheduler = DeadlineScheduler()
@@ -0,0 +1,242 @@
+from utils.misc import get_logger
+from utils.config import cfg, icfg
+
+from collections import OrderedDict, defaultdict
+import asyncio
+import os
+
+try:
+    import gspread_asyncio
+    from google.oauth2.service_account import Credentials
+except ImportError:
+    gspread_asyncio = None
+
+logger = get_logger('PvpSignups')
+
+scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+
+
+def column_letter(number):
+    """:class:`str` The A1 notation letters of a 1-indexed column"""
+    letters = ""
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def row_runs(rows):
+    """Groups row numbers into runs of consecutive rows, each written as one range
+
+    Parameters
+    -----------
+    rows: :class:`dict`
+        The values of each row, keyed by row number.
+    """
+    run = []
+    for number in sorted(rows):
+        if run and number != run[-1] + 1:
+            yield run
+            run = []
+        run.append(number)
+    if run:
+        yield run
+
+
+class GspreadSheet(object):
+    """The worksheet of an instance in a google spreadsheet, accessed through :mod:`gspread_asyncio`,
+    whose client manager spaces every API call made through it
+
+    Attributes
+    -----------
+    key: :class:`str`
+        The key of the spreadsheet, found in its URL.
+    title: :class:`str`
+        The title of the worksheet bookings are written to.
+    """
+    def __init__(self, manager, key, title):
+        self.manager = manager
+        self.key = key
+        self.title = title
+        self.worksheet = None
+
+    async def open(self):
+        if self.worksheet is None:
+            client = await self.manager.authorize()
+            spreadsheet = await client.open_by_key(self.key)
+            self.worksheet = await spreadsheet.worksheet(self.title)
+        return self.worksheet
+
+    async def ids(self):
+        """:class:`list` The values of the first column, the header included"""
+        worksheet = await self.open()
+        return await worksheet.col_values(1)
+
+    async def batch_update(self, data, rows):
+        """Writes every range in a single request, growing the worksheet to at least ``rows`` rows first"""
+        worksheet = await self.open()
+        if worksheet.ws.row_count < rows:
+            await worksheet.add_rows(rows - worksheet.ws.row_count)
+        await worksheet.batch_update(data, value_input_option="RAW")
+
+
+def gspread_sheets():
+    """:class:`dict` The sheet of every instance with a ``sheet_key`` configured, empty if sheets are not set up"""
+    credentials = getattr(cfg, "google_credentials", "data/google_credentials.json")
+    keys = {instname: getattr(instconfig, "sheet_key", None) for instname, instconfig in icfg.items()}
+    if not any(keys.values()):
+        return {}
+    if gspread_asyncio is None:
+        logger.warning("gspread_asyncio is not installed, google sheets sync is disabled")
+        return {}
+    if not os.path.isfile(credentials):
+        logger.warning(f"Google service account credentials not found at {credentials}, google sheets sync is disabled")
+        return {}
+    # the manager's delay applies to every API call, including opening the sheet and adding rows
+    manager = gspread_asyncio.AsyncioGspreadClientManager(
+        lambda: Credentials.from_service_account_file(credentials, scopes=scopes),
+        gspread_delay=60 / getattr(cfg, "sheet_requests_per_minute", 50))
+    return {instname: GspreadSheet(manager, key, getattr(icfg[instname], "sheet_worksheet", "Bookings"))
+            for instname, key in keys.items() if key}
+
+
+class SheetSync(object):
+    """Writes changed bookings to each instance's sheet from a background worker
+
+    Changed bookings are queued by ID, so any number of changes to a booking before the next batch
+    is written cost a single row, rendered from its latest state. Every batch is one request per
+    instance, with consecutive rows merged into one range. Sheets space their own requests, every
+    call :class:`GspreadSheet` makes stays within ``sheet_requests_per_minute``. The row of each
+    booking is kept in :attr:`rows`, the sheet is only read once when it is opened.
+
+    Attributes
+    -----------
+    header: :class:`list`
+        The column names, written to the first row of empty sheets.
+    synced: Callable[[`Booking`], :class:`bool`]
+        Whether a booking belongs on the sheet.
+    sheets: :class:`dict`
+        The sheet of each synced instance, objects with ``ids`` and ``batch_update`` coroutines such as :class:`GspreadSheet`.
+    rows: :class:`dict`
+        The row number of each booking ID, per instance.
+    next_row: :class:`dict`
+        The first free row of each instance's sheet.
+    dirty: :class:`collections.OrderedDict`
+        The bookings waiting to be written, keyed by ID, oldest first.
+    """
+    def __init__(self, registry, header, synced):
+        self.header = header
+        self.synced = synced
+        self.sheets = {}
+        self.rows = {}
+        self.next_row = {}
+        self.dirty = OrderedDict()
+        self._wake = None
+        self._stopping = None
+        self._task = None
+        registry.subscribe(self.on_change)
+
+    def on_change(self, event, booking, **details):
+        if event in ("updated", "status", "transferred", "taken"):
+            self.mark(booking)
+
+    def mark(self, booking):
+        """Queues a booking to be written, does nothing if it's already queued"""
+        if booking.instance not in self.sheets or not self.synced(booking):
+            return
+        self.dirty[booking.id] = booking
+        if self._wake is not None:
+            self._wake.set()
+
+    async def start(self, sheets=None):
+        """Indexes the rows of each sheet and starts the worker
+
+        Parameters
+        -----------
+        sheets: :class:Optional[`dict`]
+            The sheet of each instance to sync, read from the config with :func:`gspread_sheets` if not given.
+        """
+        sheets = gspread_sheets() if sheets is None else sheets
+        for instname, sheet in sheets.items():
+            if instname in self.sheets:
+                continue
+            try:
+                ids = await sheet.ids()
+                if not ids:
+                    await sheet.batch_update([{"range": f"A1:{column_letter(len(self.header))}1", "values": [self.header]}], 1)
+                    ids = [self.header[0]]
+            except Exception as e:
+                logger.warning(f"Failed to open the {instname} sheet, it will not be synced: {e!r}")
+                continue
+            self.rows[instname] = {booking_id: number for number, booking_id in enumerate(ids, 1) if booking_id and number > 1}
+            self.next_row[instname] = len(ids) + 1
+            self.sheets[instname] = sheet
+            logger.info(f"Indexed {len(self.rows[instname])} sheet row(s) of {instname}")
+        if self.sheets and (self._task is None or self._task.done()):
+            self._wake = asyncio.Event()
+            self._stopping = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stops the worker once it has written whatever is still queued"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            if not self._stopping.is_set():
+                # bookings changed in quick succession are written together
+                await self._sleep(getattr(cfg, "sheet_batch_interval", 2))
+            self._wake.clear()
+            while self.dirty:
+                if not await self.flush():
+                    if self._stopping.is_set():
+                        logger.warning(f"{len(self.dirty)} booking(s) were not written to the sheet before stopping")
+                        return
+                    await self._sleep(getattr(cfg, "sheet_retry_interval", 30))
+            if self._stopping.is_set():
+                return
+
+    async def _sleep(self, seconds):
+        """Waits for the given number of seconds, or until :meth:`stop` is called"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def flush(self):
+        """:class:`bool` Writes a batch of queued bookings, the ones that fail are queued again"""
+        batch = []
+        while self.dirty and len(batch) < getattr(cfg, "sheet_batch_size", 500):
+            batch.append(self.dirty.popitem(last=False)[1])
+        by_instance = defaultdict(dict)
+        for booking in batch:
+            rows = self.rows[booking.instance]
+            if booking.id not in rows:
+                rows[booking.id] = self.next_row[booking.instance]
+                self.next_row[booking.instance] += 1
+            by_instance[booking.instance][rows[booking.id]] = booking.sheet_row()
+        succeeded = True
+        unwritten = set(by_instance)
+        try:
+            for instname, rows in by_instance.items():
+                last_column = column_letter(len(self.header))
+                data = [{"range": f"A{run[0]}:{last_column}{run[-1]}", "values": [rows[number] for number in run]}
+                        for run in row_runs(rows)]
+                try:
+                    await self.sheets[instname].batch_update(data, self.next_row[instname] - 1)
+                    unwritten.discard(instname)
+                except Exception as e:
+                    logger.warning(f"Failed to write {len(rows)} row(s) to the {instname} sheet: {e!r}")
+                    succeeded = False
+        finally:
+            # failed or cancelled writes are queued again, behind any newer change to the same booking
+            for booking in batch:
+                if booking.instance in unwritten:
+                    self.dirty.setdefault(booking.id, booking)
+        return succeeded
@@ -0,0 +1,122 @@
+from collections import namedtuple
+import gzip
+import json
+import uuid
+
+buyer_fields = ("name", "realm", "faction", "class_", "spec", "rating")
+booster_fields = ("prim", "sec", "prim_cut", "sec_cut", "ad_cut", "mana_cut")
+Payload = namedtuple("Payload", ["version", "etag", "body", "gzipped"])
+
+
+def booking_view(booking):
+    """:class:`dict` A JSON serializable copy of a booking, the booking itself is never modified"""
+    return {
+        "instance": booking.instance,
+        "_author": booking.authorid,
+        "bracket": booking.bracket,
+        "status": booking.status,
+        "id": booking.id,
+        "type": booking.type,
+        "buyer": {field: getattr(booking.buyer, field, None) for field in buyer_fields},
+        "price_recommendation": booking.price_recommendation,
+        "ad_price_estimate": booking.ad_price_estimate,
+        "price": booking.price,
+        "booster": {field: getattr(booking.booster, field, None) for field in booster_fields},
+        "notes": booking.notes,
+        "post_message": getattr(booking.post_message, "id", booking.post_message),
+        "timestamp": booking.timestamp
+    }
+
+
+def record_view(record):
+    """:class:`dict` The same view as :func:`booking_view`, of a booking record (see :meth:`Booking.to_dict`)"""
+    return {
+        "instance": record["instance"],
+        "_author": record["author"],
+        "bracket": record["bracket"],
+        "status": record["status"],
+        "id": record["id"],
+        "type": record["type"],
+        "buyer": {field: record["buyer"].get(field) for field in buyer_fields},
+        "price_recommendation": record["price_recommendation"],
+        "ad_price_estimate": record["ad_price_estimate"],
+        "price": record["price"],
+        "booster": {field: record["booster"].get(field) for field in booster_fields},
+        "notes": record["notes"],
+        "post_message": record["post_message"],
+        "timestamp": record["timestamp"]
+    }
+
+
+class BookingSnapshot(object):
+    """Versioned, pre-encoded JSON document of every registered and archived booking
+
+    Each registered booking is encoded on its own and only re-encoded after the registry reports a change to it,
+    archived bookings are encoded together and only again once the archive has changed, so no per booking
+    encoding is kept for them. The joined document (and its gzipped copy) is only rebuilt when the version has moved on.
+
+    Attributes
+    -----------
+    fragments: :class:`dict`
+        The encoded JSON of each registered booking, keyed by booking ID.
+    dirty: :class:`set`
+        The IDs of bookings that have changed since they were last encoded.
+    """
+    def __init__(self, registry, archive):
+        self.registry = registry
+        self.archive = archive
+        self.fragments = {}
+        self.dirty = set()
+        self._changes = 0
+        self._archived = None
+        self._token = uuid.uuid4().hex[:8]
+        self._payload = None
+        registry.subscribe(self.on_change)
+
+    @property
+    def version(self):
+        """:class:`int` Moves on with every change to the registry or the archive, used with a per process token as the ETag of the document"""
+        return self._changes + self.archive.version
+
+    def on_change(self, event, booking, **details):
+        if event in ("removed", "archived"):
+            self.fragments.pop(booking.id, None)
+            self.dirty.discard(booking.id)
+        else:
+            self.dirty.add(booking.id)
+        self._changes += 1
+
+    def fragment(self, booking_id):
+        """:class:Optional[`str`] The encoded JSON of a single booking, None if it's neither registered nor archived"""
+        booking = self.registry.get(booking_id)
+        if booking is None:
+            record = self.archive.get(booking_id)
+            return json.dumps(record_view(record)) if record is not None else None
+        if booking_id in self.dirty or booking_id not in self.fragments:
+            self.fragments[booking_id] = json.dumps(booking_view(booking))
+            self.dirty.discard(booking_id)
+        return self.fragments[booking_id]
+
+    def archived(self):
+        """:class:`str` The members of the document for every archived booking, re-encoded only once the archive has changed"""
+        if self._archived is None or self._archived[0] != self.archive.version:
+            members = ", ".join(f"{json.dumps(booking_id)}: {json.dumps(record_view(self.archive.get(booking_id)))}" for booking_id in self.archive)
+            self._archived = (self.archive.version, members)
+        return self._archived[1]
+
+    def payload(self):
+        """:class:`Payload` The JSON document of every booking keyed by booking ID"""
+        if self._payload is None or self._payload.version != self.version:
+            members = [f"{json.dumps(booking_id)}: {self.fragment(booking_id)}" for booking_id in self.registry.by_id.keys()]
+            if len(self.archive):
+                members.append(self.archived())
+            body = "{" + ", ".join(members) + "}"
+            self._payload = Payload(self.version, f'"{self._token}-{self.version}"', body.encode("utf-8"), None)
+        return self._payload
+
+    def gzipped(self):
+        """:class:`bytes` The gzip compressed document, compressed at most once per version"""
+        payload = self.payload()
+        if payload.gzipped is None:
+            payload = self._payload = payload._replace(gzipped=gzip.compress(payload.body))
+        return payload.gzipped
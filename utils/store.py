@@ -0,0 +1,207 @@
+from utils.misc import get_logger
+from utils.config import cfg, icfg
+from utils import codec
+
+import asyncio
+import json
+import os
+
+logger = get_logger("PvpSignups")
+
+
+class BookingStore(object):
+    """Append-only journal backed storage for the bookings of a single instance
+
+    Every mutation is written as a single line to ``bookings.journal``, once the journal
+    grows past ``compact_threshold`` records it is folded into the snapshot, ``bookings.json``
+    or ``bookings.msgpack`` if binary is set. On the event loop the snapshot is written in the
+    default executor, the journal is first renamed to ``bookings.journal.compacting`` so new
+    mutations keep being appended while it is written, that file is replayed on load if a
+    compaction didn't finish. Snapshots in the other format and jsonpickle
+    records from older versions are read as well, and rewritten in the current format.
+
+    The records of archived bookings are kept out of :attr:`records` and the snapshot, they
+    are saved as a whole to ``archive.json`` (or ``archive.msgpack``), see :meth:`save_archive`.
+
+    Attributes
+    -----------
+    records: :class:`dict`
+        The current booking records (see :func:`utils.codec.upgrade`), keyed by booking ID.
+    journal_length: :class:`int`
+        The number of records written to the journal since the last compaction.
+    """
+    def __init__(self, directory, compact_threshold=500, fsync=False, binary=False):
+        if binary and codec.msgpack is None:
+            logger.warning("msgpack is not installed, bookings will be stored as JSON")
+        self.binary = binary and codec.msgpack is not None
+        self.snapshot_path = directory + ("/bookings.msgpack" if self.binary else "/bookings.json")
+        self.other_snapshot_path = directory + ("/bookings.json" if self.binary else "/bookings.msgpack")
+        self.archive_path = directory + ("/archive.msgpack" if self.binary else "/archive.json")
+        self.other_archive_path = directory + ("/archive.json" if self.binary else "/archive.msgpack")
+        self.journal_path = directory + "/bookings.journal"
+        self.compacting_path = self.journal_path + ".compacting"
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.records = {}
+        self.journal_length = 0
+        self._journal = None
+        self._compacting = None
+
+    def __contains__(self, booking_id):
+        return booking_id in self.records
+
+    def load(self):
+        """:class:`dict` Reads the snapshot and replays the journal on top of it,
+        a partially written final journal record (from a crash mid-write) is discarded."""
+        self.records = {}
+        migrate = False
+        for path in (self.snapshot_path, self.other_snapshot_path):
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    self.records = codec.loads(f.read(), binary=path.endswith(".msgpack"))
+                migrate = path != self.snapshot_path
+                break
+        for booking_id, record in self.records.items():
+            if not isinstance(record, dict) or record.get("v") != codec.schema_version:
+                self.records[booking_id] = codec.upgrade(record)
+                migrate = True
+
+        self.journal_length = 0
+        # records are whole bookings, so replaying a compacting journal already folded into the snapshot is harmless
+        for path in (self.compacting_path, self.journal_path):
+            if not os.path.isfile(path):
+                continue
+            valid_length = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Discarding torn record at the end of {path}")
+                        break
+                    self._apply(record)
+                    valid_length += len(line)
+                    self.journal_length += 1
+            if valid_length != os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(valid_length)
+
+        if self.journal_length or migrate:
+            self.compact()
+        return self.records
+
+    def put(self, booking_id, record):
+        self.records[booking_id] = record
+        self._append({"op": "put", "id": booking_id, "booking": record})
+
+    def delete(self, booking_id):
+        if booking_id not in self.records:
+            return False
+        del self.records[booking_id]
+        self._append({"op": "delete", "id": booking_id})
+        return True
+
+    def delete_many(self, booking_ids):
+        """:class:`list` Deletes several bookings with a single journal write, returns the IDs that were stored"""
+        deleted = [booking_id for booking_id in booking_ids if self.records.pop(booking_id, None) is not None]
+        if deleted:
+            self._append(*[{"op": "delete", "id": booking_id} for booking_id in deleted])
+        return deleted
+
+    def compact(self):
+        """Writes the current records to the snapshot file and truncates the journal,
+        the snapshot is replaced atomically so a crash leaves either the old or new snapshot intact."""
+        self.close()
+        self._write_snapshot(self.records)
+        if os.path.isfile(self.compacting_path):
+            os.remove(self.compacting_path)
+        open(self.journal_path, "w").close()
+        self.journal_length = 0
+
+    async def compact_in_executor(self):
+        """Like :meth:`compact`, but the snapshot is encoded and written in the default executor"""
+        self.close()
+        if os.path.isfile(self.compacting_path):
+            # a previous compaction failed, its journal is kept in front of the current one
+            with open(self.journal_path, "rb") as journal, open(self.compacting_path, "ab") as f:
+                f.write(journal.read())
+            os.remove(self.journal_path)
+        elif os.path.isfile(self.journal_path):
+            os.replace(self.journal_path, self.compacting_path)
+        # records are replaced rather than modified in place, a shallow copy is a consistent snapshot
+        records, length = dict(self.records), self.journal_length
+        self.journal_length = 0
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, records)
+            os.remove(self.compacting_path)
+        except Exception as e:
+            self.journal_length += length
+            logger.error(f"Failed to compact {self.snapshot_path}, the journal is kept: {e!r}")
+
+    def load_archive(self):
+        """:class:`dict` The records of the archived bookings, keyed by booking ID"""
+        for path in (self.archive_path, self.other_archive_path):
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    records = codec.loads(f.read(), binary=path.endswith(".msgpack"))
+                return {booking_id: codec.upgrade(record) for booking_id, record in records.items()}
+        return {}
+
+    def save_archive(self, records):
+        """Replaces the saved records of the archived bookings, blocks so it's meant to run in an executor"""
+        self._replace(self.archive_path, self.other_archive_path, records)
+
+    def _write_snapshot(self, records):
+        self._replace(self.snapshot_path, self.other_snapshot_path, records)
+        logger.info(f"Compacted {len(records)} booking(s) into {self.snapshot_path}")
+
+    def _replace(self, path, other_path, records):
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(codec.dumps(records, binary=self.binary))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        if os.path.isfile(other_path):
+            os.remove(other_path)
+
+    def _schedule_compact(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.compact()
+            return
+        if self._compacting is None or self._compacting.done():
+            self._compacting = asyncio.ensure_future(self.compact_in_executor())
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _apply(self, record):
+        if record["op"] == "put":
+            self.records[record["id"]] = codec.upgrade(record["booking"])
+        elif record["op"] == "delete":
+            self.records.pop(record["id"], None)
+
+    def _append(self, *records):
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self.journal_length += len(records)
+        if self.journal_length >= self.compact_threshold:
+            self._schedule_compact()
+
+
+istore = {
+    instname: BookingStore(
+        instconfig.directory,
+        compact_threshold=getattr(cfg, "journal_compact_threshold", 500),
+        fsync=getattr(cfg, "journal_fsync", False),
+        binary=getattr(cfg, "booking_store_format", "json") == "msgpack")
+    for instname, instconfig in icfg.items()
+}
@@ -0,0 +1,79 @@
+from utils.misc import get_logger
+from utils.config import icfg
+
+import json
+import os
+
+logger = get_logger("PvpSignups")
+
+
+class WeightStore(object):
+    """Bad luck protection weights of a single instance, held in memory and written back by :meth:`flush`
+
+    Picking a winner raises the weight of every other user and lowers the weight of the winner,
+    rather than touching every user the change is kept as a per bracket offset added to every stored weight.
+
+    Attributes
+    -----------
+    stored: :class:`dict`
+        The stored weight of each user ID, per bracket, the effective weight is the stored weight plus the offset.
+    offset: :class:`dict`
+        The amount added to every stored weight, per bracket.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.stored = {}
+        self.offset = {}
+        self.dirty = False
+
+    def load(self):
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.stored = json.load(f)
+        for bracket in ("2v2", "3v3"):
+            self.stored.setdefault(bracket, {})
+        self.offset = {bracket: 0 for bracket in self.stored.keys()}
+        self.dirty = False
+
+    def get(self, bracket, user_id):
+        """:class:`float` The weight of a user, users without a weight have a weight of 1"""
+        stored = self.stored[bracket].get(str(user_id))
+        return 1 if stored is None else round(stored + self.offset[bracket], 5)
+
+    def set(self, bracket, user_id, value):
+        self.stored[bracket][str(user_id)] = value - self.offset[bracket]
+        self.dirty = True
+
+    def weights(self, bracket):
+        """:class:`dict` The weight of every user with a stored weight"""
+        return {user_id: self.get(bracket, user_id) for user_id in self.stored[bracket].keys()}
+
+    def add_users(self, bracket, user_ids):
+        """Gives users without a stored weight the default weight of 1"""
+        for user_id in user_ids:
+            if str(user_id) not in self.stored[bracket]:
+                self.set(bracket, user_id, 1)
+
+    def apply_pick(self, bracket, winner, amount):
+        """Lowers the weight of the winner by amount and raises the weight of every other stored user by the same amount"""
+        winner_weight = self.get(bracket, winner)
+        self.offset[bracket] += amount
+        self.set(bracket, winner, winner_weight - amount)
+
+    def flush(self):
+        if not self.dirty:
+            return
+        for bracket, offset in self.offset.items():
+            self.stored[bracket] = self.weights(bracket)
+            self.offset[bracket] = 0
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.stored, f, indent=4)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+
+iweights = {}
+for instname, instconfig in icfg.items():
+    iweights[instname] = WeightStore(f"{instconfig.directory}/userweights.json")
+    iweights[instname].load()